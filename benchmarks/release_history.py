@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmarks rendering the release history of 10,000 synthetic releases, against the
+implementation that parsed every timestamp with dateutil.
+
+    python benchmarks/release_history.py [number of releases]
+"""
+from __future__ import print_function
+import datetime
+import os
+import random
+import sys
+import timeit
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from release_tools.history import RENDERERS, parse_releases, render  # noqa: E402
+
+
+def synthetic_releases(count):
+    rng = random.Random(0)
+    published = datetime.datetime(2012, 1, 1)
+    releases = []
+    for i in range(count):
+        published += datetime.timedelta(seconds=rng.randint(3600, 3 * 86400))
+        body = u"\r\n".join(u"* Fixed issue #{} in the r\u00e9lease pipeline".format(rng.randint(1, 10000))
+                            for _ in range(rng.randint(1, 20)))
+        releases.append({"name": u"v{}.{}.{}".format(i // 1000, i // 100 % 10, i % 100),
+                         "published_at": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                         "body": body})
+    releases.reverse()
+    return releases
+
+
+def dateutil_contents(json):
+    """The implementation before the fast path, for comparison"""
+    c = []
+    for release in json:
+        d = dateutil.parser.parse(release['published_at'].encode('utf-8'))
+        release_name = release['name'].encode('utf-8')
+        release_body = release['body'].encode('utf-8')
+        release_body = '\n'.join(release_body.splitlines())
+        c.append("{}, {:%Y-%m-%d}\n\n{}".format(release_name, d, release_body))
+    return str.join('\n\n\n', c)
+
+
+def best_of(fn, repeat=5):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main(count):
+    releases = synthetic_releases(count)
+    assert "".join(render(parse_releases(releases), RENDERERS["text"])) == dateutil_contents(releases)
+    baseline = best_of(lambda: dateutil_contents(releases))
+    print("{} releases, best of 5".format(count))
+    print("{:<24} {:>8.3f}s".format("dateutil (before)", baseline))
+    for name, renderer in RENDERERS.items():
+        seconds = best_of(lambda: sum(1 for _ in render(parse_releases(releases), renderer)))
+        print("{:<24} {:>8.3f}s {:>6.1f}x".format(name, seconds, baseline / seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
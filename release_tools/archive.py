@@ -0,0 +1,250 @@
+"""
+Streaming download and extraction of source archives.
+
+Archives are never held in memory as a whole. Zipballs are downloaded in chunks to
+a temporary file (zip needs random access) and extracted from there by a pool of
+workers, tarballs are extracted while they're being downloaded.
+
+Extraction always happens in a temporary directory next to the target, which is
+renamed to the target when it's complete. A crash never leaves a half populated
+directory behind.
+"""
+from __future__ import print_function
+import fnmatch
+import hashlib
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+CHUNK_SIZE = 64 * 1024
+MEGABYTE = 1024 * 1024
+DEFAULT_WORKERS = 8
+
+
+def peak_memory():
+    """Returns the peak resident memory of the process in bytes, or None if not known"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class DownloadProgress:
+    """Reports the number of bytes downloaded at regular intervals"""
+    def __init__(self, total=None, interval=16 * MEGABYTE):
+        self.total = int(total) if total else None
+        self.interval = interval
+        self.downloaded = 0
+        self._next_report = interval
+
+    def update(self, size):
+        self.downloaded += size
+        if self.downloaded >= self._next_report:
+            self._next_report += self.interval
+            print("  {}".format(self._describe()))
+
+    def done(self):
+        print("Downloaded {}".format(self._describe()))
+        memory = peak_memory()
+        if memory is not None:
+            print("Peak memory: {:.1f} MB".format(float(memory) / MEGABYTE))
+
+    def _describe(self):
+        if self.total:
+            return "{:.1f} of {:.1f} MB".format(float(self.downloaded) / MEGABYTE,
+                                                float(self.total) / MEGABYTE)
+        return "{:.1f} MB".format(float(self.downloaded) / MEGABYTE)
+
+
+class ProgressReader:
+    """Wraps a file like object, reporting the bytes read to a DownloadProgress"""
+    def __init__(self, fileobj, progress):
+        self.fileobj = fileobj
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.progress.update(len(data))
+        return data
+
+
+def is_safe_member(name):
+    """Returns False for archive members that would be written outside the target"""
+    normalized = os.path.normpath(name)
+    return not (os.path.isabs(normalized) or normalized == ".." or
+                normalized.startswith(".." + os.sep))
+
+
+def download_to_file(response, progress, directory=None):
+    """
+    Downloads the body of a streamed response in chunks to a temporary file.
+    Returns the path to the file, which the caller must remove.
+    """
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".download")
+    with os.fdopen(fd, "wb") as f:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            f.write(chunk)
+            progress.update(len(chunk))
+    return path
+
+
+def extract_atomically(target, extract):
+    """
+    Calls extract with a temporary directory next to target, then renames the
+    directory to target, replacing what was there before. If extract fails,
+    target is left untouched.
+    """
+    target = os.path.abspath(target)
+    parent = os.path.dirname(target)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    prefix = ".{}.".format(os.path.basename(target))
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=prefix + "tmp-")
+    try:
+        extract(tmp_path)
+        if os.path.exists(target):
+            old_path = tempfile.mkdtemp(dir=parent, prefix=prefix + "old-")
+            os.rmdir(old_path)
+            os.rename(target, old_path)
+            os.rename(tmp_path, target)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.rename(tmp_path, target)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+class PathFilter:
+    """
+    Selects files by glob patterns on their path in the repository, e.g. 'deploy/*'.
+    A pattern also matches everything below a directory it matches, so 'deploy' is
+    the same as 'deploy/*'.
+
+    With include patterns, only files matching one of them are selected. Files matching
+    one of the exclude patterns are never selected.
+    """
+    def __init__(self, include=None, exclude=None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+
+    def is_active(self):
+        return bool(self.include or self.exclude)
+
+    def matches(self, path):
+        if self.include and not any(self._match(path, p) for p in self.include):
+            return False
+        return not any(self._match(path, p) for p in self.exclude)
+
+    def matches_member(self, name):
+        """Matches an archive member, which is rooted in a directory named after the commit"""
+        parts = name.split("/", 1)
+        return self.matches(parts[1] if len(parts) > 1 else "")
+
+    def digest(self):
+        """A short digest of the patterns, for telling filtered downloads apart"""
+        key = "\0".join(sorted(self.include)) + "\1" + "\0".join(sorted(self.exclude))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def _match(path, pattern):
+        pattern = pattern.strip("/")
+        return fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(path, pattern + "/*")
+
+
+def extract_zip(archive_path, path, workers=DEFAULT_WORKERS, path_filter=None):
+    """
+    Extracts the zip file with a pool of workers. Each member is checked against
+    the CRC and size in the archive while it's written.
+
+    If a PathFilter is set, only the files it matches are extracted and only the
+    directories needed for them are created.
+    """
+    filtered = path_filter is not None and path_filter.is_active()
+    with closing(zipfile.ZipFile(archive_path)) as archive:
+        members = archive.infolist()
+    for member in members:
+        if not is_safe_member(member.filename):
+            raise ArchiveException("Unsafe path in archive: {}".format(member.filename))
+        if member.filename.endswith("/") and not filtered:
+            makedirs(os.path.join(path, member.filename))
+    files = [member for member in members if not member.filename.endswith("/") and
+             (not filtered or path_filter.matches_member(member.filename))]
+
+    # Every worker reads through its own handle to the archive
+    batches = [files[i::workers] for i in range(workers)]
+    pool = ThreadPool(workers)
+    try:
+        pool.map(lambda batch: _extract_zip_members(archive_path, batch, path),
+                 [batch for batch in batches if batch])
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _extract_zip_members(archive_path, members, path):
+    with closing(zipfile.ZipFile(archive_path)) as archive:
+        for member in members:
+            target = os.path.join(path, member.filename)
+            makedirs(os.path.dirname(target))
+            written = 0
+            # Reading a member to the end raises BadZipfile if the CRC doesn't match
+            with closing(archive.open(member)) as source, open(target, "wb") as dest:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    written += len(chunk)
+            if written != member.file_size:
+                raise ArchiveException("Size mismatch for {}: expected {} bytes, got {}"
+                                       .format(member.filename, member.file_size, written))
+
+
+def makedirs(path):
+    """Creates the directory and its parents, if they don't exist"""
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+def extract_tar_stream(response, path, progress, path_filter=None):
+    """
+    Extracts a tarball while it's being downloaded, one member at a time. Members
+    not matched by the PathFilter are skipped in the stream, never written to disk.
+    """
+    response.raw.decode_content = True
+    extract_tar_fileobj(ProgressReader(response.raw, progress), path, path_filter)
+
+
+def extract_tar_fileobj(fileobj, path, path_filter=None):
+    """Extracts a (possibly compressed) tar stream read from a file like object"""
+    filtered = path_filter is not None and path_filter.is_active()
+    archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    try:
+        for member in archive:
+            if not is_safe_member(member.name):
+                raise ArchiveException("Unsafe path in archive: {}".format(member.name))
+            if filtered and (member.isdir() or not path_filter.matches_member(member.name)):
+                continue
+            archive.extract(member, path)
+    finally:
+        archive.close()
+
+
+class ArchiveException(Exception):
+    pass
@@ -0,0 +1,177 @@
+"""
+Local cache of downloaded source trees, keyed by the commit they were made from.
+
+A commit never changes, so when the head of the queue hasn't moved since the last
+download, the tree is materialised from the cache with hard links instead of being
+downloaded again.
+"""
+import json
+import os
+import shutil
+import stat
+import time
+from release_tools.archive import extract_atomically
+
+
+class ArtifactCache:
+    """
+    Extracted trees in directory/<key>, with metadata in directory/<key>.json. When
+    the cache grows above max_bytes, the least recently used trees are evicted.
+
+    Note that materialised trees share their files with the cache. Files should be
+    replaced rather than modified in place, or the cached tree changes too. To catch
+    that, the cached files are made read-only, which doesn't stop root.
+    """
+    def __init__(self, directory, max_bytes=5 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def lookup(self, key):
+        """Returns the path to the cached tree, or None if it's not cached"""
+        meta_path = self._meta_path(key)
+        if not os.path.exists(meta_path):
+            return None
+        # The modification time of the metadata is used for the LRU order
+        os.utime(meta_path, None)
+        return self._tree_path(key)
+
+    def store(self, key, populate, branch=None, sha=None):
+        """
+        Calls populate with the path the tree should be created at and adds it
+        to the cache. Returns the path to the cached tree. The new tree is never
+        evicted to make room, even if it's larger than max_bytes by itself.
+
+        branch, sha: The branch and commit the tree was downloaded from, see newest
+        """
+        tree_path = self._tree_path(key)
+        populate(tree_path)
+        if hasattr(os, "link"):
+            # Without hard links the materialised trees are copies, which can't change the cache
+            make_read_only(tree_path)
+        meta = {"key": key, "size": tree_size(tree_path), "stored_at": time.time(),
+                "branch": branch, "sha": sha}
+        with open(self._meta_path(key), "w") as f:
+            json.dump(meta, f)
+        self.gc(keep=[key])
+        return tree_path
+
+    def materialize(self, key, target):
+        """Creates a copy of the cached tree at target, replacing what was there"""
+        source = self.lookup(key)
+        if source is None:
+            raise ArtifactCacheException("No tree cached for '{}'".format(key))
+        extract_atomically(target, lambda path: link_tree(source, path))
+
+    def newest(self, branch, matching=None):
+        """
+        Returns the metadata of the tree of branch that was stored last, of the ones
+        matching accepts, or None if no tree of branch is cached
+        """
+        candidates = [meta for _, meta in self._entries()
+                      if meta.get("branch") == branch and (matching is None or matching(meta))]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda meta: meta["stored_at"])
+
+    def gc(self, max_bytes=None, keep=()):
+        """
+        Evicts the least recently used trees until the cache fits within max_bytes,
+        except the trees in keep. Returns the number of bytes freed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = [(mtime, meta["size"], meta["key"]) for mtime, meta in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, key in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            if key in keep:
+                continue
+            self.remove(key)
+            freed += size
+        return freed
+
+    def remove(self, key):
+        # Remove the metadata first, so a partially removed tree is never used
+        try:
+            os.remove(self._meta_path(key))
+        except OSError:
+            pass
+        shutil.rmtree(self._tree_path(key), ignore_errors=True)
+
+    def _entries(self):
+        """The modification time and the metadata of each cached tree"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                mtime = os.stat(meta_path).st_mtime
+            except (IOError, OSError, ValueError):
+                continue
+            entries.append((mtime, meta))
+        return entries
+
+    def _tree_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+def tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def make_read_only(path):
+    """Removes the write permissions of the files in the tree at path"""
+    write = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                os.chmod(file_path, stat.S_IMODE(os.stat(file_path).st_mode) & ~write)
+
+
+def link_tree(source, target):
+    """
+    Recreates the tree at source in target, hard linking the files. Falls back
+    to copying where hard links aren't supported.
+    """
+    for root, dirs, files in os.walk(source):
+        rel = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(target, rel))
+        if not os.path.exists(target_root):
+            os.makedirs(target_root)
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+                continue
+            try:
+                os.link(src, dst)
+            except (OSError, AttributeError):
+                # Cross device, or no os.link (Python 2 on Windows). Copies are writable
+                shutil.copy2(src, dst)
+                os.chmod(dst, stat.S_IMODE(os.stat(dst).st_mode) | stat.S_IWUSR)
+        for name in dirs:
+            src = os.path.join(root, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), os.path.join(target_root, name))
+
+
+class ArtifactCacheException(Exception):
+    pass
@@ -0,0 +1,180 @@
+"""
+On-disk cache for api responses.
+
+Responses are stored together with their ETag/Last-Modified validators. Within the
+time to live an entry is used as is, after that it's revalidated with a conditional
+request. Github answers those with 304 if nothing changed, which is cheap and
+doesn't count against the rate limit.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers that are kept with the cached body
+STORED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Link"]
+# When the cache is full, it's evicted down to this fraction of max_bytes, so the
+# next writes don't each have to list the whole cache again
+GC_LOW_WATER = 0.9
+
+
+class ResponseCache:
+    """
+    A size bounded cache of responses, one file per entry. When the cache grows
+    above max_bytes, the least recently used entries are evicted.
+
+    The size is listed once, and after that estimated by counting the bytes written,
+    so the directory is only listed again when the estimate crosses max_bytes.
+    """
+    def __init__(self, directory, ttl=60, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size = None
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(url, params=None, accept=None):
+        """The key of a request. Different media types of a resource are cached separately"""
+        prepared = requests.Request("GET", url, params=params).prepare()
+        key = prepared.url if accept is None else "{} {}".format(accept, prepared.url)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """Returns the entry stored for the key, or None"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+        # The modification time is used for the LRU order
+        self._touch(path)
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry["stored_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, key, response):
+        """Stores a 200 response if it can be revalidated later. Returns the entry or None"""
+        headers = dict((name, response.headers[name]) for name in STORED_HEADERS
+                       if name in response.headers)
+        if "ETag" not in headers and "Last-Modified" not in headers:
+            return None
+        entry = {"url": response.url, "headers": headers,
+                 "content": response.content.decode("utf-8")}
+        self._write(key, entry)
+        return entry
+
+    def refresh(self, key, entry):
+        """Marks a revalidated entry as fresh again"""
+        self._write(key, entry)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+    def gc(self, max_bytes=None):
+        """
+        Evicts the least recently used entries until the cache fits within max_bytes.
+        Returns the number of bytes freed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        freed = 0
+        for _, size, name in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            freed += size
+        self._size = total - freed
+        return freed
+
+    def _write(self, key, entry):
+        entry["stored_at"] = time.time()
+        data = json.dumps(entry)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        path = self._path(key)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Windows can't rename over an existing file
+            os.remove(path)
+            os.rename(tmp_path, path)
+        # An overwritten entry is counted again, which only makes the next gc come sooner
+        if self._size is None:
+            self.gc()
+        else:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self.gc(int(self.max_bytes * GC_LOW_WATER))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+
+def parse_links(headers):
+    """Parses the Link header like requests.Response.links does"""
+    header = headers.get("Link")
+    if not header:
+        return {}
+    return dict((link.get("rel") or link.get("url"), link)
+                for link in requests.utils.parse_header_links(header))
+
+
+class CachedResponse(object):
+    """
+    A response served from the cache. Has the parts of the requests.Response
+    interface that the providers use.
+    """
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, entry):
+        self.url = entry["url"]
+        self.headers = CaseInsensitiveDict(entry["headers"])
+        self.text = entry["content"]
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    @property
+    def links(self):
+        return parse_links(self.headers)
+
+    def close(self):
+        pass
@@ -0,0 +1,133 @@
+"""
+Recording and replaying of api calls.
+
+A RecordingTransport writes every request with its response to a cassette file, one
+JSON object per line. A ReplayTransport serves the same requests from the cassette
+without any network I/O, so a command can be rerun offline exactly as it ran when it
+was recorded. Access tokens are never written to the cassette.
+"""
+import base64
+import io
+import json
+import re
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from release_tools.cache import parse_links
+from release_tools.transport import Transport
+
+SECRET_PARAMS = frozenset(["access_token"])
+SECRET_PATTERN = re.compile(r"(access_token=)[^&>;\s]*")
+# The recorded body is decoded already
+DROPPED_HEADERS = frozenset(["content-encoding", "transfer-encoding"])
+
+
+def request_key(method, url, params=None, body=None):
+    """Identifies a request, leaving out the access token"""
+    prepared = requests.Request(method, url, params=params).prepare()
+    scheme_host_path, _, query = prepared.url.partition("?")
+    query = "&".join(sorted(part for part in query.split("&")
+                            if part and part.split("=", 1)[0] not in SECRET_PARAMS))
+    return json.dumps([method, scheme_host_path, query, body], sort_keys=True)
+
+
+def redact(text):
+    return SECRET_PATTERN.sub(r"\1REDACTED", text)
+
+
+class RecordingTransport(Transport):
+    """A Transport that also writes every request and its response to a cassette"""
+    def __init__(self, path, **kwargs):
+        Transport.__init__(self, **kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        # Start a new cassette
+        open(path, "w").close()
+
+    def get(self, url, cache=True, **kwargs):
+        response = Transport.get(self, url, cache=cache, **kwargs)
+        return self._record("GET", url, kwargs, response)
+
+    def post(self, url, **kwargs):
+        response = Transport.post(self, url, **kwargs)
+        return self._record("POST", url, kwargs, response)
+
+    def _record(self, method, url, kwargs, response):
+        # Reading the content here means streamed bodies are held in memory while recording
+        # Github repeats the token in the urls of Link headers
+        headers = dict((name, redact(value)) for name, value in response.headers.items()
+                       if name.lower() not in DROPPED_HEADERS)
+        recorded = ReplayResponse(redact(response.url), response.status_code, headers, response.content)
+        entry = {"key": request_key(method, url, kwargs.get("params"), kwargs.get("json")),
+                 "status_code": recorded.status_code,
+                 "headers": dict(recorded.headers),
+                 "content": base64.b64encode(recorded.content).decode("ascii")}
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return recorded
+
+
+class ReplayTransport(Transport):
+    """
+    A Transport that serves responses from a cassette. Requests that were made several
+    times are answered in the order they were recorded, the last answer is repeated
+    after that. A request that isn't in the cassette raises CassetteException.
+    """
+    def __init__(self, path, **kwargs):
+        Transport.__init__(self, **kwargs)
+        self._responses = dict()
+        self._lock = threading.Lock()
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._responses.setdefault(entry["key"], []).append(entry)
+
+    def _get(self, url, cache, **kwargs):
+        return self.request("GET", url, **kwargs), None
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        key = request_key(method, url, kwargs.get("params"), kwargs.get("json"))
+        with self._lock:
+            entries = self._responses.get(key)
+            if not entries:
+                raise CassetteException("No recorded response for {} {}".format(method, url))
+            entry = entries.pop(0) if len(entries) > 1 else entries[0]
+        return ReplayResponse(url, entry["status_code"], entry["headers"],
+                              base64.b64decode(entry["content"]))
+
+
+class ReplayResponse(object):
+    """
+    A response with its body in memory. Has the parts of the requests.Response
+    interface that the providers use, including streaming.
+    """
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.raw = io.BytesIO(content)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    @property
+    def links(self):
+        return parse_links(self.headers)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class CassetteException(Exception):
+    pass
@@ -1,25 +1,205 @@
+import os
+import signal
+import subprocess
+import sys
+import traceback
 import click
 import yaml
 from github import GithubProvider
+from release_tools.archive import PathFilter
+from release_tools.artifacts import ArtifactCache
+from release_tools.cache import ResponseCache
+from release_tools.cassette import RecordingTransport, ReplayTransport
+from release_tools.client import socket_path
+from release_tools.compare import ComparisonCache
+from release_tools.concurrency import Executor, DEFAULT_WORKERS as EXECUTOR_WORKERS
+from release_tools.daemon import serve, DaemonException
+from release_tools.fleet import parse_fleet, fleet_status, format_table, DEFAULT_WORKERS as FLEET_WORKERS
+from release_tools.graphql import GraphQLGithubProvider, GRAPHQL_URL
+from release_tools.history import RENDERERS
+from release_tools.instrumentation import Profiler
+from release_tools.localgit import LocalGitProvider
+from release_tools.plan import Journal
+from release_tools.ratelimit import RateLimiter, LOW, NORMAL, DEFAULT_RESERVE
+from release_tools.transport import Transport
+from release_tools.watch import Watcher, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from release_tools.webhooks import RepoState, WebhookServer, WebhookStateProvider, DEFAULT_PORT
 from release_tools.workflow import Workflow, Conventions, DEVELOP_BRANCH
 
 
-def create_workflow(owner, repo, whatif, config):
-    access_token = config["access_token"] if config and "access_token" in config else None
-    provider = GithubProvider(owner, repo, access_token)
-    return Workflow(provider, Conventions, whatif)
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "release-tools")
+DISCARD_JOURNAL_HELP = "Forget a run of this command that stopped halfway, instead of resuming it"
+
+
+def keep_warm(options, key, create):
+    """
+    Returns what create returns. In the daemon it's kept between commands by key, with
+    its connection pools, rate limits or threads. Otherwise it's created every time.
+    """
+    kept = options.get("warm")
+    if kept is None:
+        return create()
+    if key not in kept:
+        kept[key] = create()
+    return kept[key]
+
+
+def load_config(options, path):
+    with open(path) as f:
+        return keep_warm(options, ("config", path, os.fstat(f.fileno()).st_mtime), lambda: yaml.load(f))
+
+
+def create_response_cache(options, fresh=False):
+    """
+    Returns the cache for api responses, or None if caching is turned off.
+
+    If fresh is set, cached responses are always revalidated. This is used by the
+    commands that write, since they must see the current state.
+    """
+    config = options["config"] or {}
+    if not options["cache"]:
+        return None
+    cache_dir = os.path.expanduser(config.get("cache_dir", DEFAULT_CACHE_DIR))
+    return ResponseCache(os.path.join(cache_dir, "responses"),
+                         ttl=0 if fresh else config.get("cache_ttl", 60),
+                         max_bytes=config.get("cache_max_bytes", 50 * 1024 * 1024))
+
+
+def create_artifact_cache(options):
+    """Returns the cache for downloaded trees, or None if caching is turned off"""
+    config = options["config"] or {}
+    if not options["cache"]:
+        return None
+    cache_dir = os.path.expanduser(config.get("cache_dir", DEFAULT_CACHE_DIR))
+    return ArtifactCache(os.path.join(cache_dir, "artifacts"),
+                         max_bytes=config.get("artifact_cache_max_bytes", 5 * 1024 * 1024 * 1024))
+
+
+def create_comparison_cache(options):
+    """Returns the cache for branch comparisons, or None if caching is turned off"""
+    config = options["config"] or {}
+    if not options["cache"]:
+        return None
+    cache_dir = os.path.expanduser(config.get("cache_dir", DEFAULT_CACHE_DIR))
+    return ComparisonCache(os.path.join(cache_dir, "comparisons"))
+
+
+def create_repo_state(options, owner, repo):
+    """Returns the model of the repository that serve-webhooks keeps up to date"""
+    config = options["config"] or {}
+    cache_dir = os.path.expanduser(config.get("cache_dir", DEFAULT_CACHE_DIR))
+    return RepoState(os.path.join(cache_dir, "webhooks", owner, repo + ".json"))
+
+
+def create_transport(options, fresh=False, pool_size=None, priority=NORMAL):
+    """
+    Returns a new transport. With --replay it serves everything from a cassette, with
+    --record it records to one. With --profile its calls are reported to the profiler.
+
+    priority: LOW for commands that only report, they leave the last calls of the
+              rate limit to the commands that write
+    """
+    if options["replay"]:
+        transport = ReplayTransport(options["replay"])
+    else:
+        config = options["config"] or {}
+        pool_size = pool_size or config.get("pool_size", 10)
+        limiter = RateLimiter(max_concurrency=pool_size,
+                              reserve=config.get("rate_limit_reserve", DEFAULT_RESERVE))
+        kwargs = dict(pool_size=pool_size,
+                      max_retries=config.get("max_retries", 3),
+                      cache=create_response_cache(options, fresh),
+                      limiter=limiter, priority=priority)
+        if options["record"]:
+            transport = RecordingTransport(options["record"], **kwargs)
+        else:
+            transport = Transport(**kwargs)
+    if options.get("profiler"):
+        transport.hooks.append(options["profiler"].record)
+    return transport
+
+
+def get_transport(options, name, fresh=False, pool_size=None, priority=NORMAL):
+    """
+    Returns a transport for the name, e.g. owner/repo. In the daemon it's kept between
+    commands, unless the command records, replays or profiles its calls.
+    """
+    if options["record"] or options["replay"] or options.get("profiler"):
+        return create_transport(options, fresh, pool_size, priority)
+    key = ("transport", options["config_path"], options["cache"], name, fresh, pool_size, priority)
+    return keep_warm(options, key, lambda: create_transport(options, fresh, pool_size, priority))
+
+
+def get_executor(options):
+    """Returns the executor shared by all workflows of the command"""
+    if "executor" not in options:
+        config = options["config"] or {}
+        workers = config.get("workers", EXECUTOR_WORKERS)
+        options["executor"] = keep_warm(options, ("executor", workers), lambda: Executor(workers))
+    return options["executor"]
+
+
+def create_workflow(owner, repo, options, fresh=False, transport=None, priority=NORMAL):
+    """
+    transport: The Transport to use, for sharing one between workflows. A new one
+               is created if not set.
+    priority: The rate limit priority of a new transport
+    """
+    config = options["config"] or {}
+    access_token = config.get("access_token")
+    transport = transport or get_transport(options, "{}/{}".format(owner, repo), fresh, priority=priority)
+    if config.get("graphql"):
+        provider = GraphQLGithubProvider(owner, repo, access_token, transport,
+                                         config.get("graphql_url", GRAPHQL_URL))
+    else:
+        provider = GithubProvider(owner, repo, access_token, transport)
+    if config.get("mirror_dir"):
+        mirror_path = os.path.join(os.path.expanduser(config["mirror_dir"]), owner, repo + ".git")
+        provider = LocalGitProvider(provider, mirror_path)
+    # The commands that write must see the current state, not what the webhooks have told
+    if options["cache"] and not fresh and not options["replay"]:
+        provider = WebhookStateProvider(provider, create_repo_state(options, owner, repo))
+    cache_dir = os.path.expanduser(config.get("cache_dir", DEFAULT_CACHE_DIR))
+    journal = Journal(os.path.join(cache_dir, "journals", owner, repo + ".json"))
+    return Workflow(provider, Conventions, options['whatif'], create_artifact_cache(options),
+                    get_executor(options), create_comparison_cache(options), journal)
+
+
+def report_profile(profiler, command, show, output):
+    if show:
+        print ""
+        print "Profile of '{}':".format(command)
+        for line in profiler.report():
+            print "  " + line
+    if output:
+        profiler.write_jsonl(output, command)
 
 
 @click.group()
 @click.option('--whatif/--not-whatif', default=False)
 @click.option('--config')
+@click.option('--cache/--no-cache', default=True,
+              help="Cache api responses and downloaded trees on disk")
+@click.option('--record', metavar='CASSETTE', help="Record all api calls to this file")
+@click.option('--replay', metavar='CASSETTE', help="Serve all api calls from this file, offline")
+@click.option('--profile', is_flag=True, help="Print a summary of the api calls when done")
+@click.option('--profile-output', metavar='FILE', help="Append every api call to this file as JSON lines")
 @click.pass_context
-def cli(ctx, whatif, config):
+def cli(ctx, whatif, config, cache, record, replay, profile, profile_output):
+    if record and replay:
+        raise click.UsageError("--record and --replay can't be used together")
     ctx.obj['whatif'] = whatif
+    ctx.obj['cache'] = cache
+    ctx.obj['record'] = record
+    ctx.obj['replay'] = replay
+    ctx.obj['config_path'] = config
+    if profile or profile_output:
+        profiler = Profiler()
+        ctx.obj['profiler'] = profiler
+        ctx.call_on_close(lambda: report_profile(profiler, ctx.invoked_subcommand, profile, profile_output))
     # Read config file containing access token:
     if config:
-        with open(config) as f:
-            ctx.obj["config"] = yaml.load(f)
+        ctx.obj["config"] = load_config(ctx.obj, config)
     else:
         ctx.obj["config"] = None
 
@@ -31,20 +211,26 @@ def cli(ctx, whatif, config):
 @click.argument('owner')
 @click.argument('repo')
 @click.option('--major', is_flag=True)
+@click.option('--discard-journal', is_flag=True, help=DISCARD_JOURNAL_HELP)
 @click.pass_context
-def create_cand(ctx, owner, repo, major):
+def create_cand(ctx, owner, repo, major, discard_journal):
     print "Creating a release candidate from {}".format(DEVELOP_BRANCH)
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
+    workflow = create_workflow(owner, repo, ctx.obj, fresh=True)
+    if discard_journal:
+        workflow.discard_journal()
     workflow.create_release_candidate(major_inc=major)
 
 
 @cli.command('create-hotfix')
 @click.argument('owner')
 @click.argument('repo')
+@click.option('--discard-journal', is_flag=True, help=DISCARD_JOURNAL_HELP)
 @click.pass_context
-def create_hotfix(ctx, owner, repo):
+def create_hotfix(ctx, owner, repo, discard_journal):
     print "Creating a hotfix branch"
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
+    workflow = create_workflow(owner, repo, ctx.obj, fresh=True)
+    if discard_journal:
+        workflow.discard_journal()
     workflow.create_hotfix()
 
 
@@ -52,10 +238,13 @@ def create_hotfix(ctx, owner, repo):
 @click.argument('owner')
 @click.argument('repo')
 @click.option('--force/--not-force', default=False)
+@click.option('--discard-journal', is_flag=True, help=DISCARD_JOURNAL_HELP)
 @click.pass_context
-def accept(ctx, owner, repo, force):
+def accept(ctx, owner, repo, force, discard_journal):
     print "Accepting the current release candidate"
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
+    workflow = create_workflow(owner, repo, ctx.obj, fresh=True)
+    if discard_journal:
+        workflow.discard_journal()
     workflow.accept_release_candidate(force)
 
 
@@ -64,22 +253,87 @@ def accept(ctx, owner, repo, force):
 @click.argument('repo')
 @click.argument('path')
 @click.option('--force/--not-force', default=False)
+@click.option('--workers', type=int, help="Number of workers extracting the archive")
+@click.option('--delta', is_flag=True,
+              help="Only download the files changed since the newest download of the branch, "
+                   "or since the latest release")
+@click.option('--delta-base', help="Only download the files changed since this ref")
+@click.option('--include', multiple=True, help="Only download files matching this glob, e.g. 'deploy/*'")
+@click.option('--exclude', multiple=True, help="Don't download files matching this glob")
 @click.pass_context
-def download(ctx, owner, repo, path, force):
+def download(ctx, owner, repo, path, force, workers, delta, delta_base, include, exclude):
+    """
+    Downloads the head of the queue to PATH/<branch>.
+
+    With the cache on, the downloaded files are read-only hard links to the artifact
+    cache. Replace files instead of writing to them, or copy the tree first, otherwise
+    the cached tree changes too.
+    """
     print "Downloading the next release in the queue"
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
-    workflow.download_next_in_queue(path, force)
+    workflow = create_workflow(owner, repo, ctx.obj, fresh=True)
+    workflow.download_next_in_queue(path, force, workers, delta_base, PathFilter(include, exclude), delta)
+
+
+@cli.command()
+@click.argument('owner')
+@click.argument('repo')
+@click.option('--path', help="Download the head of the queue into this directory when it changes")
+@click.option('--hook', help="Run this shell command when the head of the queue changes. "
+                             "It gets RELEASE_TOOLS_BRANCH and RELEASE_TOOLS_SHA in its environment")
+@click.option('--workers', type=int, help="Number of workers extracting the archive")
+@click.option('--min-interval', type=float, default=DEFAULT_MIN_INTERVAL,
+              help="Seconds between polls after a change")
+@click.option('--max-interval', type=float, default=DEFAULT_MAX_INTERVAL,
+              help="Seconds between polls when nothing has changed for a while")
+@click.pass_context
+def watch(ctx, owner, repo, path, hook, workers, min_interval, max_interval):
+    """Polls the queue and acts when its head changes"""
+    workflow = create_workflow(owner, repo, ctx.obj, fresh=True, priority=LOW)
+
+    def on_change(branch, sha):
+        if path:
+            workflow.download_next_in_queue(path, True, workers)
+        if hook:
+            env = dict(os.environ, RELEASE_TOOLS_BRANCH=branch, RELEASE_TOOLS_SHA=sha)
+            code = subprocess.call(hook, shell=True, env=env)
+            if code != 0:
+                print "The hook failed with exit code {}".format(code)
+                return False
+    try:
+        Watcher(workflow, on_change, min_interval, max_interval).run()
+    except KeyboardInterrupt:
+        print "Stopped watching"
 
 
 @cli.command('download-release-history')
 @click.argument('owner')
 @click.argument('repo')
 @click.argument('directory')
+@click.option('--incremental', is_flag=True,
+              help="Only add the releases that are newer than the newest one in the file")
+@click.option('--format', 'output_format', type=click.Choice(RENDERERS.keys()), default='text')
 @click.pass_context
-def download_release_history(ctx, owner, repo, directory):
+def download_release_history(ctx, owner, repo, directory, incremental, output_format):
     print "Downloading release history"
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
-    workflow.download_release_history(directory)
+    workflow = create_workflow(owner, repo, ctx.obj, priority=LOW)
+    workflow.download_release_history(directory, incremental, RENDERERS[output_format])
+
+
+@cli.group()
+def cache():
+    """Manage the local caches"""
+    pass
+
+
+@cache.command('gc')
+@click.option('--max-bytes', type=int,
+              help="Evict until the artifact cache is this small. Defaults to the configured size")
+@click.pass_context
+def cache_gc(ctx, max_bytes):
+    options = dict(ctx.obj, cache=True)
+    freed = create_response_cache(options).gc()
+    freed += create_artifact_cache(options).gc(max_bytes)
+    print "Freed {:.1f} MB".format(float(freed) / (1024 * 1024))
 
 
 @cli.command()
@@ -87,21 +341,75 @@ def download_release_history(ctx, owner, repo, directory):
 @click.argument('repo')
 @click.pass_context
 def latest(ctx, owner, repo):
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
+    workflow = create_workflow(owner, repo, ctx.obj, priority=LOW)
     latest_version = workflow.get_latest_version()
     print "Latest version: {0}".format(latest_version)
 
 
+@cli.command()
+@click.option('--workers', type=int, help="Number of repositories handled concurrently")
+@click.pass_context
+def fleet(ctx, workers):
+    """Status of all repositories listed under 'fleet' in the config"""
+    repos = parse_fleet(ctx.obj['config'])
+    if not repos:
+        print "No repositories listed under 'fleet' in the config"
+        return
+    workers = workers or (ctx.obj['config'] or {}).get("fleet_workers", FLEET_WORKERS)
+    # One transport for all repositories, with a connection for each worker
+    transport = get_transport(ctx.obj, "fleet", pool_size=workers, priority=LOW)
+    workflows = [create_workflow(owner, repo, ctx.obj, transport=transport) for owner, repo in repos]
+    for line in format_table(fleet_status(workflows, transport, workers)):
+        print line
+
+
+@cli.command('serve-webhooks')
+@click.argument('repos', nargs=-1)
+@click.option('--host', default='localhost')
+@click.option('--port', type=int, default=DEFAULT_PORT)
+@click.pass_context
+def serve_webhooks(ctx, repos, host, port):
+    """
+    Keeps the state of the repositories up to date from Github webhooks, so the
+    commands that only read don't call the api. REPOS are given as owner/repo and
+    default to the 'fleet' in the config.
+    """
+    config = ctx.obj['config'] or {}
+    repos = parse_fleet({"fleet": list(repos)}) if repos else parse_fleet(config)
+    if not repos:
+        print "No repositories given or listed under 'fleet' in the config"
+        return
+    served = dict()
+    server = None
+    # Stopped by the service manager, the models must be removed like on ctrl-c
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for owner, repo in repos:
+            provider = create_workflow(owner, repo, ctx.obj, fresh=True).provider
+            state = create_repo_state(ctx.obj, owner, repo)
+            served["{}/{}".format(owner, repo)] = (state, provider)
+            state.seed(provider)
+        server = WebhookServer((host, port), served, config.get("webhook_secret"))
+        print "Listening for webhooks on http://{}:{}/".format(host, server.server_port)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print "Stopped listening"
+    finally:
+        if server is not None:
+            server.server_close()
+        for state, _ in served.values():
+            state.remove()
+
+
 @cli.command()
 @click.argument('owner')
 @click.argument('repo')
 @click.pass_context
 def status(ctx, owner, repo):
-    workflow = create_workflow(owner, repo, ctx.obj['whatif'], ctx.obj['config'])
-
-    branches = workflow.provider.get_branches()
-    branch_names = [branch["name"] for branch in branches]
+    workflow = create_workflow(owner, repo, ctx.obj, priority=LOW)
+    workflow.prefetch()
 
+    branch_names = workflow.get_branch_names()
     queue = workflow.get_queue()
 
     latest_version = workflow.get_latest_version()
@@ -120,15 +428,52 @@ def status(ctx, owner, repo):
 
     print ""
     print "Queue:"
-    # TODO: Use cache for api calls when possible
     for branch in queue:
-        pull_requests = len(workflow.provider.get_pull_requests(branch))
+        pull_requests = workflow.get_pull_request_count(branch)
         print "  {} (PRs={})".format(branch, pull_requests)
 
-    # TODO: Compare relevant branches
+    comparisons = workflow.get_branch_comparisons()
+    if comparisons:
+        print ""
+        print "Merges:"
+        for comparison in comparisons:
+            print "  {}".format(comparison)
     print ""
 
 
+@cli.command()
+def daemon():
+    """
+    Runs the commands that only read in this process, kept warm between them. The
+    release-tools command sends them to $RELEASE_TOOLS_SOCKET, or
+    ~/.cache/release-tools/daemon.sock, while the daemon runs.
+    """
+    path = socket_path()
+    kept = dict()
+    print "Listening on {}".format(path)
+    try:
+        serve(path, lambda args: run_command(args, kept))
+    except DaemonException as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        print "Stopped listening"
+
+
+def run_command(args, kept):
+    """Runs a command sent to the daemon. Returns its exit code"""
+    try:
+        cli.main(args=args, prog_name="release-tools", obj={"warm": kept})
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print >> sys.stderr, e.code
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
 def cli_main():
     cli(obj={})
 
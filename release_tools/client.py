@@ -0,0 +1,96 @@
+"""
+The release-tools command.
+
+Commands that only read are sent to the daemon (release-tools daemon) over a Unix
+domain socket when it's running, so they're answered by a warm process. All other
+commands, and all commands when the daemon isn't running, run in this process. Only
+the standard library is imported until it's known that the command runs here.
+"""
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.path.join("~", ".cache", "release-tools", "daemon.sock")
+# The commands the daemon runs. The others write, prompt, run until they're stopped or
+# use paths relative to the working directory.
+FORWARDED_COMMANDS = frozenset(["latest", "status", "fleet"])
+# Options of the group that need a transport of their own, or write files
+LOCAL_OPTIONS = frozenset(["--record", "--replay", "--profile", "--profile-output"])
+
+
+def socket_path():
+    """The daemon's socket, $RELEASE_TOOLS_SOCKET if it's set"""
+    return os.path.expanduser(os.environ.get("RELEASE_TOOLS_SOCKET", DEFAULT_SOCKET))
+
+
+def connect(path):
+    """Returns a socket connected to the daemon, or None if it isn't running"""
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def forwarded_args(args):
+    """
+    Returns the arguments to send to the daemon, with the path of the config made
+    absolute, or None if the command has to run in this process
+    """
+    forwarded = []
+    i = 0
+    while i < len(args) and args[i].startswith("-"):
+        name, _, value = args[i].partition("=")
+        if name in LOCAL_OPTIONS:
+            return None
+        if name == "--config":
+            if not value:
+                if i + 1 == len(args):
+                    return None
+                i += 1
+                value = args[i]
+            forwarded.append("--config=" + os.path.abspath(value))
+        else:
+            forwarded.append(args[i])
+        i += 1
+    if i == len(args) or args[i] not in FORWARDED_COMMANDS:
+        return None
+    return forwarded + args[i:]
+
+
+def run_in_daemon(args):
+    """Runs the command in the daemon. Returns its exit code, or None if the daemon isn't running"""
+    sock = connect(socket_path())
+    if sock is None:
+        return None
+    try:
+        sock.sendall(json.dumps({"args": args}) + "\n")
+        line = sock.makefile("rb").readline()
+    finally:
+        sock.close()
+    if not line:
+        # The daemon stopped while running the command, which only read
+        return None
+    response = json.loads(line)
+    sys.stdout.write(response["stdout"].encode("utf-8"))
+    sys.stderr.write(response["stderr"].encode("utf-8"))
+    return response["exit_code"]
+
+
+def main():
+    args = forwarded_args(sys.argv[1:])
+    if args is not None:
+        exit_code = run_in_daemon(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    from release_tools.cli import cli_main
+    cli_main()
+
+
+if __name__ == "__main__":
+    main()
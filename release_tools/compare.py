@@ -0,0 +1,93 @@
+"""
+Ahead/behind comparisons between the branches of the workflow.
+
+A comparison of two commits never changes, so comparisons are cached on disk by
+their pair of shas for good. Comparing branches that haven't moved since the last
+time costs no api calls at all, and the ones that have moved are compared
+concurrently.
+"""
+import json
+import os
+from release_tools.github import GithubException
+
+
+class BranchComparison:
+    """How far the source branch is ahead of and behind the target it's merged into"""
+    def __init__(self, source, target, ahead_by=None, behind_by=None, error=None):
+        """
+        ahead_by: Commits on the source that aren't on the target yet
+        behind_by: Commits on the target that aren't on the source
+        """
+        self.source = source
+        self.target = target
+        self.ahead_by = ahead_by
+        self.behind_by = behind_by
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return "{} -> {}: {}".format(self.source, self.target, self.error)
+        return "{} -> {}: {} to merge, {} behind".format(self.source, self.target,
+                                                         self.ahead_by, self.behind_by)
+
+
+class ComparisonCache:
+    """The ahead/behind counts of commit pairs, in directory/<base sha>...<head sha>.json"""
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def lookup(self, base_sha, head_sha):
+        path = self._path(base_sha, head_sha)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def store(self, base_sha, head_sha, counts):
+        path = self._path(base_sha, head_sha)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(counts, f)
+        os.rename(tmp_path, path)
+
+    def _path(self, base_sha, head_sha):
+        return os.path.join(self.directory, "{}...{}.json".format(base_sha, head_sha))
+
+
+def compare_branches(provider, pairs, cache=None, executor=None):
+    """
+    Returns a BranchComparison for each (source, source sha, target, target sha), in
+    the same order. Pairs that aren't in the cache are compared concurrently if an
+    Executor is given.
+    """
+    counts = dict()
+    missing = []
+    for _, source_sha, _, target_sha in pairs:
+        key = (target_sha, source_sha)
+        cached = cache.lookup(*key) if cache is not None else None
+        if cached is not None:
+            counts[key] = cached
+        elif key not in missing:
+            missing.append(key)
+
+    def compare(key):
+        try:
+            comparison = provider.compare(*key)
+        except GithubException as e:
+            return {"error": str(e)}
+        return {"ahead_by": comparison["ahead_by"], "behind_by": comparison["behind_by"]}
+
+    results = executor.map(compare, missing) if executor is not None else [compare(key) for key in missing]
+    for key, result in zip(missing, results):
+        counts[key] = result
+        if cache is not None and "error" not in result:
+            cache.store(key[0], key[1], result)
+
+    comparisons = []
+    for source, source_sha, target, target_sha in pairs:
+        result = counts[(target_sha, source_sha)]
+        comparisons.append(BranchComparison(source, target, result.get("ahead_by"),
+                                            result.get("behind_by"), result.get("error")))
+    return comparisons
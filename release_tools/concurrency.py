@@ -0,0 +1,78 @@
+"""
+Concurrent calls to providers.
+
+Providers are blocking, so independent calls (e.g. the branch list, the latest
+release and the pull requests of each branch in the queue) are run together on a
+bounded pool of threads and waited for as futures.
+"""
+import inspect
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_WORKERS = 8
+
+
+class Executor:
+    """Runs calls on a bounded pool of threads"""
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.pool = ThreadPool(workers)
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules the call and returns a Future for its result"""
+        return Future(self.pool.apply_async(_call, (fn, args, kwargs)))
+
+    def map(self, fn, items):
+        """Calls fn for each item concurrently. Returns the results in the same order"""
+        return gather(*[self.submit(fn, item) for item in items])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class Future:
+    """The result of a call that may not have finished yet"""
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def done(self):
+        return self._async_result.ready()
+
+    def result(self, timeout=None):
+        """Waits for the call and returns its result, or raises its exception"""
+        if timeout is None:
+            # Waiting without a timeout can't be interrupted with Ctrl-C in Python 2
+            while not self._async_result.ready():
+                self._async_result.wait(1)
+        return self._async_result.get(timeout)
+
+
+def gather(*futures):
+    """Waits for all futures and returns their results"""
+    return [future.result() for future in futures]
+
+
+def _call(fn, args, kwargs):
+    result = fn(*args, **kwargs)
+    # Generators must be consumed on the worker, or the calls would happen on the caller
+    if inspect.isgenerator(result):
+        result = list(result)
+    return result
+
+
+class AsyncProvider(object):
+    """
+    Has the same methods as the provider it wraps, but each call is run by the
+    executor and returns a Future. Results that are generators are returned as lists.
+    """
+    def __init__(self, provider, executor):
+        self.provider = provider
+        self.executor = executor
+
+    def __getattr__(self, name):
+        method = getattr(self.provider, name)
+        if not callable(method):
+            return method
+
+        def submit(*args, **kwargs):
+            return self.executor.submit(method, *args, **kwargs)
+        return submit
@@ -0,0 +1,78 @@
+"""
+A daemon that runs commands in a warm process.
+
+Otherwise every command starts Python, imports requests, yaml and click, reads the
+config and opens new connections to the api. The daemon does that once, and keeps
+the configs, executors and the transports of each owner/repo, with their connection
+pools, rate limits and caches, between commands. release_tools.client sends it the
+commands that only read over a Unix domain socket.
+"""
+from __future__ import print_function
+import json
+import os
+import sys
+from SocketServer import UnixStreamServer, StreamRequestHandler
+from StringIO import StringIO
+from release_tools.client import connect
+
+
+def serve(path, run):
+    """
+    Runs the commands sent to the socket at path until interrupted.
+
+    run: Called with the arguments of a command. Returns its exit code.
+    """
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        raise DaemonException("A daemon is already listening on {}".format(path))
+    if os.path.exists(path):
+        # Left behind by a daemon that didn't stop cleanly
+        os.remove(path)
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    # Only the user may connect, the commands run with their access token
+    umask = os.umask(0o077)
+    try:
+        server = DaemonServer(path, run)
+    finally:
+        os.umask(umask)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+class DaemonServer(UnixStreamServer):
+    """
+    Runs one command at a time. The output of a command is captured by replacing
+    sys.stdout, so commands can't run concurrently.
+    """
+    def __init__(self, path, run):
+        UnixStreamServer.__init__(self, path, DaemonHandler)
+        self.run = run
+
+
+class DaemonHandler(StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connected to check whether the daemon is running
+            return
+        request = json.loads(line)
+        stdout, stderr = StringIO(), StringIO()
+        saved = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = stdout, stderr
+        try:
+            exit_code = self.server.run(request["args"])
+        finally:
+            sys.stdout, sys.stderr = saved
+        self.wfile.write(json.dumps({"stdout": stdout.getvalue(),
+                                     "stderr": stderr.getvalue(),
+                                     "exit_code": exit_code}) + "\n")
+
+
+class DaemonException(Exception):
+    pass
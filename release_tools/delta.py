@@ -0,0 +1,118 @@
+"""
+Builds the tree of a commit by patching the tree of an earlier commit.
+
+Going from one candidate to the next usually changes a handful of files. Instead of
+downloading the whole archive, the changed files are fetched one by one and applied
+to a copy of the base tree.
+"""
+import os
+import stat
+from multiprocessing.pool import ThreadPool
+import requests
+from release_tools.archive import is_safe_member, makedirs, DEFAULT_WORKERS
+from release_tools.artifacts import link_tree
+from release_tools.github import GithubException, EXECUTABLE_MODE, SYMLINK_MODE
+
+# Github lists at most this many files in a comparison
+COMPARE_FILES_LIMIT = 300
+
+
+def patch_tree(provider, base_tree, base_sha, head_sha, target, workers=DEFAULT_WORKERS,
+               path_filter=None):
+    """
+    Creates the tree of head_sha in target, from base_tree which holds the tree of base_sha
+    as extracted from an archive: a single directory named after the commit. If the base
+    tree was downloaded with a PathFilter, the same filter must be given.
+
+    Returns the number of files fetched. Raises DeltaException if head_sha can't be built
+    from base_sha, e.g. if base_sha is not an ancestor of head_sha, too many files have
+    changed, a changed file is a symlink or submodule, or fetching a file fails.
+    """
+    comparison = provider.compare(base_sha, head_sha)
+    if comparison["merge_base_commit"]["sha"] != base_sha:
+        raise DeltaException("{} is not an ancestor of {}".format(base_sha, head_sha))
+    files = comparison.get("files", [])
+    if len(files) >= COMPARE_FILES_LIMIT:
+        raise DeltaException("Too many changed files for a delta download: {}".format(len(files)))
+
+    roots = os.listdir(base_tree)
+    if len(roots) != 1:
+        raise DeltaException("Unexpected layout of the base tree at '{}'".format(base_tree))
+    # Archives are rooted in a directory named <owner>-<repo>-<short sha>
+    base_root = roots[0]
+    head_root = "{}-{}".format(base_root.rsplit("-", 1)[0], head_sha[:7])
+
+    removed = []
+    fetch = []
+    for changed in files:
+        for filename in [changed["filename"], changed.get("previous_filename", "")]:
+            if filename and not is_safe_member(filename):
+                raise DeltaException("Unsafe path in comparison: {}".format(filename))
+        if changed["status"] == "renamed":
+            removed.append(changed["previous_filename"])
+        if changed["status"] == "removed":
+            removed.append(changed["filename"])
+        elif changed["status"] != "unchanged" and \
+                (path_filter is None or path_filter.matches(changed["filename"])):
+            fetch.append(changed["filename"])
+    entries = _fetched_entries(provider, head_sha, fetch) if fetch else dict()
+
+    link_tree(os.path.join(base_tree, base_root), os.path.join(target, head_root))
+    root = os.path.join(target, head_root)
+    for filename in removed:
+        _remove(root, filename)
+
+    def fetch_file(filename):
+        path = os.path.join(root, filename)
+        mode = os.stat(path).st_mode if os.path.isfile(path) else None
+        # The file may be linked to the base tree, so it must be replaced, not written to
+        if os.path.lexists(path):
+            os.remove(path)
+        makedirs(os.path.dirname(path))
+        try:
+            provider.download_file(filename, head_sha, path)
+        except (GithubException, requests.exceptions.RequestException) as e:
+            raise DeltaException("Fetching '{}' failed: {}".format(filename, e))
+        if entries[filename]["mode"] == EXECUTABLE_MODE:
+            os.chmod(path, 0o755)
+        elif mode is not None:
+            os.chmod(path, stat.S_IMODE(mode))
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(fetch_file, fetch)
+    finally:
+        pool.close()
+        pool.join()
+    return len(fetch)
+
+
+def _fetched_entries(provider, head_sha, filenames):
+    """
+    Returns the tree entries of the files to fetch, by path. Only regular files come
+    out of the contents api as they are in an archive, symlinks and submodules don't.
+    """
+    tree = provider.get_tree(head_sha)
+    if tree.get("truncated"):
+        raise DeltaException("The tree of {} is too large to check the changed files".format(head_sha))
+    entries = dict((entry["path"], entry) for entry in tree["tree"])
+    for filename in filenames:
+        entry = entries.get(filename)
+        if entry is None or entry["type"] != "blob" or entry["mode"] == SYMLINK_MODE:
+            raise DeltaException("'{}' is not a regular file in {}".format(filename, head_sha))
+    return entries
+
+
+def _remove(root, filename):
+    """Removes a file from the tree, and the directories it leaves empty"""
+    path = os.path.join(root, filename)
+    if os.path.lexists(path):
+        os.remove(path)
+    parent = os.path.dirname(path)
+    while parent != root and os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
+
+
+class DeltaException(Exception):
+    pass
@@ -0,0 +1,90 @@
+"""
+Status of many repositories at once.
+
+Each repository gets its own Workflow, but they all share one Transport, i.e. one
+connection pool, response cache and rate limit. The repositories are handled
+concurrently by a bounded pool of workers.
+"""
+import time
+from multiprocessing.pool import ThreadPool
+import requests
+from release_tools.cassette import CassetteException
+from release_tools.github import GithubException
+from release_tools.localgit import LocalGitException
+from release_tools.workflow import WorkflowException
+
+DEFAULT_WORKERS = 8
+# Errors that are reported for the repository, instead of failing the whole fleet
+REPO_ERRORS = (GithubException, WorkflowException, CassetteException, LocalGitException,
+               requests.exceptions.RequestException)
+
+
+def parse_fleet(config):
+    """
+    Returns the (owner, repo) pairs listed under 'fleet' in the config. Each item can
+    be either 'owner/repo' or a mapping with the keys owner and repo.
+    """
+    repos = []
+    for item in (config or {}).get("fleet", []):
+        if isinstance(item, dict):
+            repos.append((item["owner"], item["repo"]))
+        else:
+            owner, repo = item.split("/", 1)
+            repos.append((owner, repo))
+    return repos
+
+
+class RepoStatus:
+    def __init__(self, owner, repo):
+        self.owner = owner
+        self.repo = repo
+        self.latest_version = None
+        self.queue = []
+        self.pull_requests = dict()
+        self.error = None
+
+    def name(self):
+        return "{}/{}".format(self.owner, self.repo)
+
+
+def fleet_status(workflows, transport, workers=DEFAULT_WORKERS):
+    """Returns the RepoStatus of each workflow, in the same order"""
+    def status(workflow):
+        result = RepoStatus(workflow.provider.owner, workflow.provider.repo)
+        if transport.rate_limit_exhausted():
+            result.error = "Rate limit exhausted until {}".format(
+                time.strftime("%H:%M:%S", time.localtime(transport.rate_limit_reset)))
+            return result
+        try:
+            workflow.prefetch()
+            result.latest_version = workflow.get_latest_version()
+            result.queue = workflow.get_queue()
+            for branch in result.queue:
+                result.pull_requests[branch] = workflow.get_pull_request_count(branch)
+        except REPO_ERRORS as e:
+            # Some exceptions have no message
+            result.error = str(e) or type(e).__name__
+        return result
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(status, workflows)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def format_table(statuses):
+    """Returns the lines of a table with one row per repository"""
+    rows = [("Repository", "Latest", "Queue")]
+    for status in statuses:
+        if status.error is not None:
+            queue = "error: {}".format(status.error.splitlines()[0])
+        else:
+            queue = ", ".join("{} (PRs={})".format(branch, status.pull_requests[branch])
+                              for branch in status.queue) or "-"
+        latest = str(status.latest_version) if status.latest_version else "-"
+        rows.append((status.name(), latest, queue))
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    return ["{}  {}  {}".format(row[0].ljust(widths[0]), row[1].ljust(widths[1]), row[2])
+            for row in rows]
@@ -1,39 +1,66 @@
 #!/usr/bin/env python
 from __future__ import print_function
-import requests
-import zipfile
-import StringIO
-import dateutil.parser
+import os
+import shutil
 import sys
+import tempfile
+import urllib
+from multiprocessing.pool import ThreadPool
+from release_tools.archive import DownloadProgress, download_to_file, extract_atomically, \
+    extract_zip, extract_tar_stream, makedirs, CHUNK_SIZE, DEFAULT_WORKERS
+from release_tools.history import TextRenderer, parse_releases, read_newest_release, render
+from release_tools.ratelimit import LOW
+from release_tools.refs import RefResolver
+from release_tools.transport import Transport
+
+# The largest page size Github allows for list resources
+PAGE_SIZE = 100
+# Filtered downloads with at most this many files fetch them one by one
+SPARSE_FILES_LIMIT = 50
+EXECUTABLE_MODE = "100755"
+SYMLINK_MODE = "120000"
 
 
 class GithubProvider:
-    def __init__(self, owner, repo, access_token=None):
+    def __init__(self, owner, repo, access_token=None, transport=None):
+        """
+        transport: The Transport used for all api calls. Providers can share one
+                   to share its connection pool. A new one is created if not set.
+        """
         self.owner = owner
         self.repo = repo
         self.access_token = access_token
+        self.transport = transport or Transport()
+        self.refs = RefResolver(self)
 
     def get_latest_version_tag_name(self):
-        url = "https://api.github.com/repos/{}/{}/releases/latest{}"\
-                  .format(self.owner, self.repo, self.access_token_postfix())
-        response = requests.get(url)
+        endpoint = "/repos/{owner}/{repo}/releases/latest"
+        response = self.transport.get(self._url(endpoint) + self.access_token_postfix(), endpoint=endpoint)
         if response.status_code == 200:
             json = response.json()
             return json["tag_name"]
         else:
             raise GithubException(response.text)
 
-    def get_refs_heads(self):
-        url = "https://api.github.com/repos/{}/{}/git/refs/heads?access_token={}"\
-                  .format(self.owner, self.repo, self.access_token)
-        response = requests.get(url)
-        return response.json()
+    def get_ref(self, ref):
+        """
+        Returns the commit sha of a full ref name, like refs/heads/master, or None if
+        there's no such ref
+        """
+        endpoint = "/repos/{owner}/{repo}/git/ref/{ref}"
+        url = self._url(endpoint, ref=ref[len("refs/"):] if ref.startswith("refs/") else ref)
+        response = self.transport.get(url, params={'access_token': self.access_token}, endpoint=endpoint)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise GithubException(response.text)
+        target = response.json()["object"]
+        # An annotated tag points to the tag object, not the commit
+        return self.get_commit_sha(ref) if target["type"] == "tag" else target["sha"]
 
-    def get_refs_head(self, ref):
-        heads = self.get_refs_heads()
-        filtered = [x for x in heads if x["ref"] == ref]
-        assert len(filtered) == 1
-        return filtered[0]["object"]["sha"]
+    def get_refs(self, prefix):
+        """Yields all refs starting with the prefix, like heads/release-. All refs if it's empty"""
+        return self._get_paged("/repos/{owner}/{repo}/git/matching-refs/{prefix}", prefix=prefix)
 
     def create_branch_from_master(self, new_branch):
         """
@@ -41,12 +68,13 @@ class GithubProvider:
 
         If the branch already exists, it will be ignored without an exception
         """
-        sha = self.get_refs_head("refs/heads/master")
+        sha = self.refs.resolve("refs/heads/master")
 
         body = {"ref": "refs/heads/{}".format(new_branch), "sha": sha}
-        url = "https://api.github.com/repos/{}/{}/git/refs{}" \
-                  .format(self.owner, self.repo, self.access_token_postfix())
-        response = requests.post(url, json=body)
+        endpoint = "/repos/{owner}/{repo}/git/refs"
+        # Safe to resend, an existing branch is reported with 422
+        response = self.transport.post(self._url(endpoint) + self.access_token_postfix(), json=body,
+                                       idempotent=True, endpoint=endpoint)
 
         if response.status_code == 201:
             print("Branch successfully created")
@@ -54,10 +82,11 @@ class GithubProvider:
             print("Branch already exists")  # TODO: Check error code def in docs
 
     def merge(self, base, head, commit_message):
-        url = "https://api.github.com/repos/{}/{}/merges{}"\
-                  .format(self.owner, self.repo, self.access_token_postfix())
+        endpoint = "/repos/{owner}/{repo}/merges"
         json = {"base": base, "head": head, "commit_message": commit_message}
-        response = requests.post(url, json=json)
+        response = self.transport.post(self._url(endpoint) + self.access_token_postfix(), json=json,
+                                       endpoint=endpoint)
+        self.refs.invalidate(base)
         if response.status_code == 201:
             print("Successfully merged '{}' into '{}'".format(head, base))
         elif response.status_code == 204:
@@ -69,94 +98,206 @@ class GithubProvider:
             raise GithubException(msg)
 
     def create_pull_request(self, base, head, title, body):
-        url = "https://api.github.com/repos/{}/{}/pulls{}"\
-                  .format(self.owner, self.repo, self.access_token_postfix())
+        endpoint = "/repos/{owner}/{repo}/pulls"
         json = {"head": head, "base": base, "title": title, "body": body}
-        resp = requests.post(url, json=json)
+        resp = self.transport.post(self._url(endpoint) + self.access_token_postfix(), json=json,
+                                   endpoint=endpoint)
         if resp.status_code == 201:
             print("A pull request has been created from '{}' to '{}'".format(head, base))
         else:
             print(resp.status_code, resp.text)
 
-    def download_archive(self, branch, save_to_path, ball="zipball"):
-        """Ball can be either zipball or tarball"""
+    def download_archive(self, branch, save_to_path, ball="zipball", workers=DEFAULT_WORKERS,
+                         path_filter=None):
+        """
+        Ball can be either zipball or tarball
+
+        The archive is extracted into a temporary directory that replaces save_to_path
+        when it's complete. Zipballs are extracted by the given number of workers.
+
+        If a PathFilter is set, only the files it matches are extracted. When it includes
+        few enough files, they're fetched one by one instead of downloading the archive.
+        """
+        if path_filter is not None and path_filter.include and \
+                self._download_sparse(branch, save_to_path, path_filter, workers):
+            return
         # TODO: Test on Windows
-        url = "https://api.github.com/repos/{owner}/{repo}/{archive_format}/{ref}{token}"\
-              .format(owner=self.owner, repo=self.repo, archive_format=ball, ref=branch, token=self.access_token_postfix())
-        response = requests.get(url)
-        if response.status_code == 200:
-            print("Downloaded the archive. Extracting...")
-            archive = zipfile.ZipFile(StringIO.StringIO(response.content))
-            archive.extractall(save_to_path)
-            print("Extracted")
-
-    def download_release_history(self, path):
-        url = "https://api.github.com/repos/{owner}/{repo}/releases{token}"\
-              .format(owner=self.owner, repo=self.repo, token=self.access_token_postfix())
-        response = requests.get(url)
-        if response.status_code == 200:
-            print("Writing to file...")
-            with open(path, 'w') as f:
-                f.write(self._release_history_contents(response.json()))
-            print("done.")
+        endpoint = "/repos/{owner}/{repo}/" + ball + "/{ref}"
+        url = self._url(endpoint, ref=branch) + self.access_token_postfix()
+        response = self.transport.get(url, stream=True, endpoint=endpoint)
+        if response.status_code != 200:
+            raise GithubException(response.text)
+        progress = DownloadProgress(response.headers.get("Content-Length"))
+        if ball == "tarball":
+            print("Downloading and extracting the archive...")
+            extract_atomically(save_to_path,
+                               lambda path: extract_tar_stream(response, path, progress, path_filter))
+            progress.done()
         else:
+            # Next to the target, so the archive doesn't fill a small /tmp
+            directory = os.path.dirname(os.path.abspath(save_to_path))
+            makedirs(directory)
+            archive_path = download_to_file(response, progress, directory=directory)
+            try:
+                progress.done()
+                print("Downloaded the archive. Extracting...")
+                extract_atomically(save_to_path,
+                                   lambda path: extract_zip(archive_path, path, workers, path_filter))
+            finally:
+                os.remove(archive_path)
+        print("Extracted")
+
+    def _download_sparse(self, ref, save_to_path, path_filter, workers):
+        """
+        Fetches the files matched by the filter one by one, laid out like an extracted
+        archive. Returns False if there are too many of them, or files that can't be
+        fetched on their own.
+        """
+        tree = self.get_tree(ref)
+        if tree.get("truncated"):
+            return False
+        blobs = [entry for entry in tree["tree"]
+                 if entry["type"] != "tree" and path_filter.matches(entry["path"])]
+        if len(blobs) > SPARSE_FILES_LIMIT or \
+                any(entry["type"] != "blob" or entry["mode"] == SYMLINK_MODE for entry in blobs):
+            return False
+
+        sha = self.get_commit_sha(ref)
+        root_name = "{}-{}-{}".format(self.owner, self.repo, sha[:7])
+        print("Fetching {} files...".format(len(blobs)))
+
+        def fetch(path):
+            def fetch_blob(entry):
+                target = os.path.join(path, root_name, entry["path"])
+                makedirs(os.path.dirname(target))
+                self.download_file(entry["path"], sha, target)
+                if entry["mode"] == EXECUTABLE_MODE:
+                    os.chmod(target, 0o755)
+            pool = ThreadPool(workers)
+            try:
+                pool.map(fetch_blob, blobs)
+            finally:
+                pool.close()
+                pool.join()
+        extract_atomically(save_to_path, fetch)
+        print("Fetched")
+        return True
+
+    def get_tree(self, ref):
+        """Returns the tree of the ref with all its entries, unless it's truncated for being too large"""
+        return self._get("/repos/{owner}/{repo}/git/trees/{ref}", {'recursive': 1}, ref=ref)
+
+    def download_release_history(self, path, incremental=False, renderer=TextRenderer):
+        """
+        Writes the release history, newest first. Releases are written as their pages
+        are fetched, to a temporary file that replaces the file when it's complete.
+
+        incremental: Only fetch the releases newer than the newest one in the file,
+                     and put them before the history that's already there
+        renderer: One of the RENDERERS, the format of the file
+        """
+        newest = read_newest_release(path, renderer) if incremental else None
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix=".release-history-")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                print("Writing to file...")
+                written = 0
+                for chunk in render(parse_releases(self.get_releases(), newest), renderer):
+                    f.write(chunk)
+                    written += 1
+                if newest is not None and written:
+                    f.write(renderer.separator)
+                    with open(path) as existing:
+                        shutil.copyfileobj(existing, f)
+            if newest is not None and not written:
+                os.remove(tmp_path)
+                print("No new releases.")
+                return
+            os.chmod(tmp_path, os.stat(path).st_mode if os.path.exists(path) else 0o644)
+            os.rename(tmp_path, path)
+        except GithubException:
+            os.remove(tmp_path)
             raise GithubException("Something went wrong, contents cannot be downloaded")
+        except:
+            os.remove(tmp_path)
+            raise
+        print("done.")
+
+    def get_releases(self):
+        """Yields all releases, newest first"""
+        # Only used for reporting, so it may wait for writes
+        return self._get_paged("/repos/{owner}/{repo}/releases", priority=LOW)
 
-    def _release_history_contents(self, json):
-        c = []
-        for release in json:
-            d = dateutil.parser.parse(release['published_at'].encode('utf-8'))
-            release_name = release['name'].encode('utf-8')
-            release_body = release['body'].encode('utf-8')
-            release_body = '\n'.join(release_body.splitlines())
-            c.append("{}, {:%Y-%m-%d}\n\n{}".format(release_name, d, release_body))
-        return str.join('\n\n\n', c)
+    def _release_history_contents(self, json, renderer=TextRenderer):
+        return "".join(render(parse_releases(json), renderer))
 
     def get_branches(self):
-        url = "https://api.github.com/repos/{}/{}/branches{}"\
-                  .format(self.owner, self.repo, self.access_token_postfix())
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise GithubException(response.text)
+        """Yields all branches. Pages are fetched as the caller iterates"""
+        return self._get_paged("/repos/{owner}/{repo}/branches")
 
     def tag_release(self, tag_name, branch):
         # Tags a commit as a release on Github
-        url = "https://api.github.com/repos/{}/{}/releases{}"\
-                  .format(self.owner, self.repo, self.access_token_postfix())
+        endpoint = "/repos/{owner}/{repo}/releases"
         # TODO: Release description
         json = {"tag_name": tag_name, "target_commitish": branch,
                 "name": tag_name, "body": "", "draft": False, "prerelease": False}
-        response = requests.post(url, json=json)
+        response = self.transport.post(self._url(endpoint) + self.access_token_postfix(), json=json,
+                                       endpoint=endpoint)
         if response.status_code == 201:
             print("HEAD of master marked as release {}".format(tag_name))
         else:
             raise GithubException(response.text)
 
-    def get_pull_requests(self, base_branch):
-        """Returns the list of open pull requests to the base"""
-        return self._get("/repos/{owner}/{repo}/pulls", {'base': base_branch})
+    def get_pull_requests(self, base_branch=None):
+        """Yields the open pull requests to the base, or all open pull requests if it isn't set"""
+        params = {'base': base_branch} if base_branch is not None else None
+        return self._get_paged("/repos/{owner}/{repo}/pulls", params)
 
     def has_pull_requests(self, base_branch):
-        return len(self.get_pull_requests(base_branch)) > 0
+        return any(True for _ in self.get_pull_requests(base_branch))
 
-    def _get(self, resource, params={}):
-        url = self._url(resource)
+    def _get(self, resource, params=None, **fields):
+        """fields: Values for the fields of the resource template other than owner and repo"""
+        url = self._url(resource, **fields)
+        params = dict(params or {})
         params.update({'access_token': self.access_token})
-        resp = requests.get(url, params=params)
+        resp = self.transport.get(url, params=params, endpoint=resource)
         if resp.status_code == 200:
             return resp.json()
         else:
             raise GithubException(resp.text)
 
-    def _url(self, templ):
+    def _get_paged(self, resource, params=None, priority=None, **fields):
+        """
+        Yields the items of a list resource. The next page is only fetched, by following
+        the 'next' link, when the caller has consumed the previous one.
+
+        priority: The rate limit priority of the calls, defaults to the transport's
+        fields: Values for the fields of the resource template other than owner and repo
+        """
+        url = self._url(resource, **fields)
+        params = dict(params or {})
+        params.update({'access_token': self.access_token, 'per_page': PAGE_SIZE})
+        while url:
+            resp = self.transport.get(url, params=params, endpoint=resource, priority=priority)
+            if resp.status_code != 200:
+                raise GithubException(resp.text)
+            for item in resp.json():
+                yield item
+            url = resp.links.get("next", {}).get("url")
+            # The next link contains the query already, except possibly the token
+            params = None if url is None or "access_token=" in url \
+                else {'access_token': self.access_token}
+
+    def _url(self, templ, **fields):
         """
         Returns a github api URL from the template specified
         in the help, similar to /repos/{owner}/{repo}/pulls
         """
         req = templ.format(owner=self.owner,
-                           repo=self.repo)
+                           repo=self.repo,
+                           **fields)
         return "{base}{req}".format(
             base="https://api.github.com",
             req=req)
@@ -165,10 +306,40 @@ class GithubProvider:
         return "?access_token={}".format(self.access_token)
 
     def compare(self, base, head):
-        url = "https://api.github.com/repos/{}/{}/compare/{}...{}{}"\
-              .format(self.owner, self.repo, base, head, self.access_token_postfix())
-        response = requests.get(url)
-        print(response.status_code, response.json())
+        """
+        Returns the comparison between two commits, including the list of changed files
+        """
+        endpoint = "/repos/{owner}/{repo}/compare/{base}...{head}"
+        url = self._url(endpoint, base=base, head=head) + self.access_token_postfix()
+        response = self.transport.get(url, endpoint=endpoint)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise GithubException(response.text)
+
+    def get_commit_sha(self, ref):
+        """Resolves a branch, tag or sha to the sha of the commit"""
+        endpoint = "/repos/{owner}/{repo}/commits/{ref}"
+        response = self.transport.get(self._url(endpoint, ref=ref), params={'access_token': self.access_token},
+                                      headers={"Accept": "application/vnd.github.v3.sha"}, endpoint=endpoint)
+        if response.status_code == 200:
+            return response.text.strip()
+        else:
+            raise GithubException(response.text)
+
+    def download_file(self, path, ref, save_to_path):
+        """Downloads a single file from the repository at the given ref"""
+        endpoint = "/repos/{owner}/{repo}/contents/{path}"
+        # Paths can have characters like '#' and '?' that would end the path of the url
+        quoted = urllib.quote(path.encode("utf-8") if isinstance(path, unicode) else path)
+        response = self.transport.get(self._url(endpoint, path=quoted), stream=True,
+                                      params={'ref': ref, 'access_token': self.access_token},
+                                      headers={"Accept": "application/vnd.github.v3.raw"}, endpoint=endpoint)
+        if response.status_code != 200:
+            raise GithubException(response.text)
+        with open(save_to_path, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
 
 
 class GithubException(Exception):
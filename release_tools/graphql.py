@@ -0,0 +1,94 @@
+"""
+A Github provider that reads the state of the queue with the GraphQL api.
+
+The latest release, all branches with their head commits and the open pull requests
+are fetched in one query, instead of one REST call for each. Everything else is
+inherited from the REST provider.
+"""
+from __future__ import print_function
+from release_tools.github import GithubProvider, GithubException
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+REPO_STATE_QUERY = """
+query($owner: String!, $name: String!,
+      $withRefs: Boolean!, $refsCursor: String,
+      $withPulls: Boolean!, $pullsCursor: String) {
+  repository(owner: $owner, name: $name) {
+    latestRelease { tagName }
+    refs(refPrefix: "refs/heads/", first: 100, after: $refsCursor) @include(if: $withRefs) {
+      pageInfo { hasNextPage endCursor }
+      nodes { name target { oid } }
+    }
+    pullRequests(states: OPEN, first: 100, after: $pullsCursor) @include(if: $withPulls) {
+      pageInfo { hasNextPage endCursor }
+      nodes { baseRefName }
+    }
+  }
+}
+"""
+
+
+class GraphQLGithubProvider(GithubProvider):
+    def __init__(self, owner, repo, access_token=None, transport=None, graphql_url=GRAPHQL_URL):
+        GithubProvider.__init__(self, owner, repo, access_token, transport)
+        self.graphql_url = graphql_url
+        # The GraphQL api needs a token. Set to False when it turns out not to work
+        self.graphql_available = access_token is not None
+
+    def get_repo_state(self):
+        """
+        Returns the latest release tag, the branches and the number of open pull requests
+        to each branch. This is one round trip, unless there are more than 100 branches
+        or pull requests.
+
+        Returns None if the GraphQL api isn't available, the caller should then fall back
+        to the REST calls.
+        """
+        if not self.graphql_available:
+            return None
+        branches = []
+        pull_request_counts = dict()
+        variables = {"owner": self.owner, "name": self.repo,
+                     "withRefs": True, "refsCursor": None,
+                     "withPulls": True, "pullsCursor": None}
+        while variables["withRefs"] or variables["withPulls"]:
+            repository = self._query(REPO_STATE_QUERY, variables)
+            if repository is None:
+                return None
+            if repository["latestRelease"] is None:
+                raise GithubException("No release found in {}/{}".format(self.owner, self.repo))
+            latest_tag_name = repository["latestRelease"]["tagName"]
+            if variables["withRefs"]:
+                refs = repository["refs"]
+                branches.extend({"name": node["name"], "commit": {"sha": node["target"]["oid"]}}
+                                for node in refs["nodes"])
+                variables["withRefs"] = refs["pageInfo"]["hasNextPage"]
+                variables["refsCursor"] = refs["pageInfo"]["endCursor"]
+            if variables["withPulls"]:
+                pulls = repository["pullRequests"]
+                for node in pulls["nodes"]:
+                    base = node["baseRefName"]
+                    pull_request_counts[base] = pull_request_counts.get(base, 0) + 1
+                variables["withPulls"] = pulls["pageInfo"]["hasNextPage"]
+                variables["pullsCursor"] = pulls["pageInfo"]["endCursor"]
+        return {"latest_tag_name": latest_tag_name,
+                "branches": branches,
+                "pull_request_counts": pull_request_counts}
+
+    def _query(self, query, variables):
+        """Runs the query and returns its repository, or None if the api isn't available"""
+        headers = {"Authorization": "bearer {}".format(self.access_token)}
+        # Queries only read, so they can safely be retried
+        response = self.transport.post(self.graphql_url, json={"query": query, "variables": variables},
+                                       headers=headers, idempotent=True, endpoint="/graphql")
+        if response.status_code != 200:
+            print("GraphQL api not available ({}), falling back to REST".format(response.status_code))
+            self.graphql_available = False
+            return None
+        result = response.json()
+        if result.get("errors"):
+            print("GraphQL query failed, falling back to REST: {}".format(result["errors"][0].get("message")))
+            self.graphql_available = False
+            return None
+        return result["data"]["repository"]
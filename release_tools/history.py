@@ -0,0 +1,127 @@
+"""
+Rendering of the release history.
+
+Releases from the api go through one pipeline of generators: they're parsed into
+Release tuples, cut off at a release that's already in the history when adding to
+it, and rendered entry by entry by one of the renderers, so the history can be
+written while the pages of releases are still coming in.
+"""
+import collections
+import datetime
+import json
+import os
+import dateutil.parser
+
+Release = collections.namedtuple("Release", ["name", "published_at", "published", "body"])
+
+
+def parse_timestamp(value):
+    """
+    Parses a timestamp like 2017-03-02T10:00:00Z, the only format Github sends, without
+    the general parser. Anything else is left to dateutil.
+    """
+    if len(value) == 20 and value[4] == "-" and value[7] == "-" and value[10] == "T" and \
+            value[13] == ":" and value[16] == ":" and value[19] == "Z":
+        try:
+            return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                     int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            pass
+    return dateutil.parser.parse(value)
+
+
+def normalize_newlines(body):
+    """Turns \\r\\n and \\r into \\n and drops one trailing newline, like joining the lines would"""
+    if "\r" in body:
+        body = body.replace("\r\n", "\n").replace("\r", "\n")
+    if body.endswith("\n"):
+        body = body[:-1]
+    return body
+
+
+def parse_releases(json_releases, until=None):
+    """
+    Yields the releases from the api as Release tuples, with utf-8 encoded name and body.
+
+    until: The (name, date) of a release. Stops at that release, or at the first one
+           published before that date
+    """
+    for release in json_releases:
+        name = release["name"].encode("utf-8")
+        published = parse_timestamp(release["published_at"])
+        if until is not None and (name == until[0] or published.date() < until[1]):
+            return
+        yield Release(name, release["published_at"], published,
+                      normalize_newlines(release["body"]).encode("utf-8"))
+
+
+def render(releases, renderer):
+    """Yields the rendered releases, with the renderer's separator between them"""
+    first = True
+    for release in releases:
+        if not first:
+            yield renderer.separator
+        yield renderer.render(release)
+        first = False
+
+
+def read_newest_release(path, renderer):
+    """
+    Returns the (name, date) of the first release in a release history file, or None
+    if there's no such file or it's empty
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        first_line = f.readline().rstrip("\n")
+    if not first_line:
+        return None
+    return renderer.read_heading(first_line)
+
+
+class TextRenderer:
+    """The name and date of each release, followed by its description"""
+    separator = "\n\n\n"
+
+    @staticmethod
+    def render(release):
+        return "{}, {:%Y-%m-%d}\n\n{}".format(release.name, release.published, release.body)
+
+    @staticmethod
+    def read_heading(line):
+        name, _, published = line.rpartition(", ")
+        return name, datetime.datetime.strptime(published, "%Y-%m-%d").date()
+
+
+class MarkdownRenderer:
+    """A section for each release"""
+    separator = "\n\n"
+
+    @staticmethod
+    def render(release):
+        return "## {} ({:%Y-%m-%d})\n\n{}".format(release.name, release.published, release.body)
+
+    @staticmethod
+    def read_heading(line):
+        name, _, published = line[len("## "):].rpartition(" (")
+        return name, datetime.datetime.strptime(published.rstrip(")"), "%Y-%m-%d").date()
+
+
+class JsonLinesRenderer:
+    """A JSON object for each release"""
+    separator = ""
+
+    @staticmethod
+    def render(release):
+        return json.dumps({"name": release.name, "published_at": release.published_at,
+                           "body": release.body}, sort_keys=True) + "\n"
+
+    @staticmethod
+    def read_heading(line):
+        release = json.loads(line)
+        return release["name"].encode("utf-8"), parse_timestamp(release["published_at"]).date()
+
+
+RENDERERS = collections.OrderedDict([("text", TextRenderer),
+                                     ("markdown", MarkdownRenderer),
+                                     ("jsonl", JsonLinesRenderer)])
@@ -0,0 +1,104 @@
+"""
+Instrumentation of api calls.
+
+The transport calls its hooks with an ApiCall for every request it answers, whether
+from the network or from the response cache. A Profiler is such a hook: it collects
+the calls of one command and reports where the time went, per endpoint and split
+between I/O and everything else.
+"""
+from __future__ import print_function
+import json
+import math
+import threading
+import time
+
+
+class ApiCall(object):
+    """One api call, as seen by the caller"""
+    def __init__(self, endpoint, method, status_code, size, started, latency, cache=None):
+        """
+        endpoint: The url template, like /repos/{owner}/{repo}/pulls
+        size: Bytes in the response body, None if it was streamed without a length
+        started: When the call was made, as a timestamp
+        latency: Seconds until the response was there, including retries
+        cache: 'hit', 'revalidated' or 'miss', None if the response cache wasn't used
+        """
+        self.endpoint = endpoint
+        self.method = method
+        self.status_code = status_code
+        self.size = size
+        self.started = started
+        self.latency = latency
+        self.cache = cache
+
+    def as_dict(self):
+        return {"endpoint": self.endpoint, "method": self.method,
+                "status_code": self.status_code, "bytes": self.size,
+                "started": self.started, "latency": self.latency, "cache": self.cache}
+
+
+class Profiler:
+    """Collects the api calls of one command"""
+    def __init__(self):
+        self.calls = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, call):
+        """The transport hook"""
+        with self._lock:
+            self.calls.append(call)
+
+    def io_time(self):
+        """Seconds during which at least one call was waiting. Concurrent calls overlap"""
+        total = 0.0
+        end = None
+        for call in sorted(self.calls, key=lambda c: c.started):
+            call_end = call.started + call.latency
+            if end is None or call.started > end:
+                total += call.latency
+                end = call_end
+            elif call_end > end:
+                total += call_end - end
+                end = call_end
+        return total
+
+    def report(self, elapsed=None):
+        """Returns the summary as lines of text"""
+        if elapsed is None:
+            elapsed = time.time() - self.started
+        by_endpoint = dict()
+        for call in self.calls:
+            by_endpoint.setdefault((call.method, call.endpoint), []).append(call)
+        lines = ["{:<6} {:<50} {:>5} {:>6} {:>9} {:>9} {:>10}".format(
+            "Method", "Endpoint", "Calls", "Cached", "Total(s)", "p95(s)", "Bytes")]
+        # Slowest endpoints first
+        for (method, endpoint), calls in sorted(by_endpoint.items(),
+                                                key=lambda item: -sum(c.latency for c in item[1])):
+            latencies = [call.latency for call in calls]
+            cached = sum(1 for call in calls if call.cache in ("hit", "revalidated"))
+            size = sum(call.size or 0 for call in calls)
+            lines.append("{:<6} {:<50} {:>5} {:>6} {:>9.3f} {:>9.3f} {:>10}".format(
+                method, endpoint, len(calls), cached, sum(latencies), percentile(latencies, 95), size))
+        io_time = self.io_time()
+        lines.append("")
+        lines.append("{} api calls in {:.3f}s: {:.3f}s waiting for I/O, {:.3f}s in workflow logic"
+                     .format(len(self.calls), elapsed, io_time, max(elapsed - io_time, 0)))
+        return lines
+
+    def write_jsonl(self, path, command):
+        """Appends one JSON object for each call to the file, tagged with the command"""
+        with open(path, "a") as f:
+            for call in self.calls:
+                entry = call.as_dict()
+                entry["command"] = command
+                f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def percentile(values, percent):
+    """The nearest-rank percentile of the values, 0 if there are none"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
@@ -0,0 +1,173 @@
+"""
+A provider that reads branches and tags from a local bare mirror of the repository.
+
+The mirror is brought up to date with one 'git fetch' the first time it's read, after
+which branch lists, ref lookups and archives are answered locally. Releases and pull
+requests only exist on Github, so those, and all writes, go to the remote provider.
+"""
+from __future__ import print_function
+import base64
+import os
+import re
+import subprocess
+from release_tools.archive import extract_atomically, extract_tar_fileobj
+from release_tools.refs import RefResolver
+
+VERSION_TAG = re.compile(r"^v\d+\.\d+\.\d+$")
+# Reads the remote could answer, but that are answered from the mirror instead
+NOT_DELEGATED = frozenset(["get_repo_state"])
+
+
+class LocalGitProvider(object):
+    """
+    Looks like the GithubProvider. Methods that aren't answered from the mirror are
+    passed on to the remote provider.
+    """
+    def __init__(self, remote, mirror_path, url=None):
+        """
+        remote: The GithubProvider for everything that isn't in git
+        mirror_path: Where the bare mirror is kept. It's cloned if it doesn't exist
+        url: The url to clone from. Defaults to the repository on github.com
+        """
+        self.remote = remote
+        self.owner = remote.owner
+        self.repo = remote.repo
+        self.mirror_path = mirror_path
+        self.url = url or "https://github.com/{}/{}.git".format(self.owner, self.repo)
+        self._synced = False
+        self.refs = RefResolver(self)
+
+    def __getattr__(self, name):
+        if name in NOT_DELEGATED:
+            raise AttributeError(name)
+        return getattr(self.remote, name)
+
+    def sync(self):
+        """
+        Clones the mirror, or fetches all refs into it if it already exists. Raises
+        LocalGitException if git fails.
+        """
+        if os.path.exists(self.mirror_path):
+            self._git(["fetch", "--prune", "--quiet", "origin"], env=self._auth_env())
+        else:
+            try:
+                subprocess.check_call(["git", "clone", "--mirror", "--quiet", self.url, self.mirror_path],
+                                      env=self._auth_env())
+            except subprocess.CalledProcessError as e:
+                raise LocalGitException("git clone of {} failed with exit code {}".format(self.url, e.returncode))
+        self._synced = True
+
+    def get_branches(self):
+        """Yields the branches, like the Github api but only with name and commit sha"""
+        output = self._read(["for-each-ref", "--format=%(refname:short) %(objectname)", "refs/heads"])
+        for line in output.splitlines():
+            name, sha = line.split(" ")
+            yield {"name": name, "commit": {"sha": sha}}
+
+    def get_latest_version_tag_name(self):
+        """
+        The highest version tag in the mirror. Every release is tagged, so this is the
+        latest release unless a version tag was made without a release.
+        """
+        output = self._read(["tag", "--list", "--sort=-v:refname", "v*"])
+        for tag in output.splitlines():
+            if VERSION_TAG.match(tag):
+                return tag
+        return self.remote.get_latest_version_tag_name()
+
+    def get_ref(self, ref):
+        """Returns the commit sha of a full ref name, or None if there's no such ref"""
+        try:
+            return self.get_commit_sha(ref)
+        except LocalGitException:
+            return None
+
+    def get_remote_ref(self, ref):
+        """Returns the commit sha of a full ref name as it is on the remote now, not in the mirror"""
+        return self.remote.get_ref(ref)
+
+    def get_refs(self, prefix):
+        """Yields the refs starting with the prefix, like the Github api but only with the sha"""
+        pattern = "refs/" + prefix
+        if not pattern.endswith("/"):
+            # Patterns only match up to a slash, unless they're globs
+            pattern += "*"
+        # Annotated tags are peeled to their commit
+        output = self._read(["for-each-ref", "--format=%(refname) %(objectname) %(*objectname)", pattern])
+        for line in output.splitlines():
+            ref, sha, peeled = (line.split(" ") + [""])[:3]
+            yield {"ref": ref, "object": {"sha": peeled or sha}}
+
+    def get_commit_sha(self, ref):
+        return self._read(["rev-parse", "--verify", "--quiet", ref + "^{commit}"]).strip()
+
+    def download_archive(self, branch, save_to_path, ball="zipball", workers=None, path_filter=None):
+        """
+        Extracts the tree of the branch with 'git archive', laid out like a Github archive.
+        The ball and workers are ignored, there's nothing to download.
+        """
+        sha = self.get_commit_sha(branch)
+        prefix = "{}-{}-{}/".format(self.owner, self.repo, sha[:7])
+
+        def extract(path):
+            process = subprocess.Popen(["git", "--git-dir", self.mirror_path, "archive",
+                                        "--format=tar", "--prefix=" + prefix, sha],
+                                       stdout=subprocess.PIPE)
+            try:
+                extract_tar_fileobj(process.stdout, path, path_filter)
+            finally:
+                process.stdout.close()
+                if process.wait() != 0:
+                    raise LocalGitException("git archive failed for {}".format(sha))
+        extract_atomically(save_to_path, extract)
+
+    def invalidate(self):
+        """Fetches into the mirror again before the next read"""
+        self._synced = False
+        self.refs.invalidate()
+
+    def create_branch_from_master(self, new_branch):
+        self.remote.create_branch_from_master(new_branch)
+        self._synced = False
+
+    def merge(self, base, head, commit_message):
+        try:
+            self.remote.merge(base, head, commit_message)
+        finally:
+            self._synced = False
+            self.refs.invalidate(base)
+
+    def tag_release(self, tag_name, branch):
+        self.remote.tag_release(tag_name, branch)
+        self._synced = False
+
+    def _read(self, args):
+        if not self._synced:
+            self.sync()
+        return self._git(args)
+
+    def _git(self, args, env=None):
+        try:
+            return subprocess.check_output(["git", "--git-dir", self.mirror_path] + args, env=env)
+        except subprocess.CalledProcessError as e:
+            raise LocalGitException("git {} failed with exit code {}".format(args[0], e.returncode))
+
+    def _auth_env(self):
+        """
+        The environment of the git commands that talk to the remote. The token is passed
+        as config in the environment (git 2.31 or later), since the arguments of a
+        process can be read by any user. Git never prompts for credentials, a rejected
+        token fails the command instead of waiting for input.
+        """
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.remote.access_token:
+            credentials = base64.b64encode("x-access-token:{}".format(self.remote.access_token))
+            index = int(env.get("GIT_CONFIG_COUNT", 0))
+            env["GIT_CONFIG_KEY_{}".format(index)] = "http.extraheader"
+            env["GIT_CONFIG_VALUE_{}".format(index)] = "Authorization: basic {}".format(credentials)
+            env["GIT_CONFIG_COUNT"] = str(index + 1)
+        return env
+
+
+class LocalGitException(Exception):
+    pass
@@ -0,0 +1,143 @@
+"""
+Plans of writes to the provider, and their execution.
+
+A command that writes first reads what it needs and builds a Plan: the steps it's
+going to take and which steps each of them has to wait for. With whatif the plan is
+only printed. Otherwise the steps are executed, the ones that don't depend on each
+other concurrently, and each finished step is written to a Journal. If a step fails,
+running the command again picks up from the journal instead of repeating the steps
+that were done, like a merge.
+"""
+from __future__ import print_function
+import collections
+import json
+import os
+import sys
+
+Step = collections.namedtuple("Step", ["name", "description", "action", "requires"])
+
+
+class Plan:
+    def __init__(self, key, params):
+        """
+        key: Identifies what the plan does, e.g. "accept release-1.3.0"
+        params: What the plan was built from, so it can be built again to resume it
+        """
+        self.key = key
+        self.params = params
+        self.steps = collections.OrderedDict()
+
+    def add(self, name, description, action, requires=()):
+        """Adds a step that calls action, after the steps named in requires"""
+        for required in requires:
+            if required not in self.steps:
+                raise PlanException("Step '{}' requires unknown step '{}'".format(name, required))
+        self.steps[name] = Step(name, description, action, tuple(requires))
+        return name
+
+    def describe(self, done=()):
+        """Returns the steps as lines of text"""
+        lines = []
+        for step in self.steps.values():
+            line = "  [{}] {}".format("done" if step.name in done else step.name, step.description)
+            if step.requires:
+                line += " (after {})".format(", ".join(step.requires))
+            lines.append(line)
+        return lines
+
+
+def execute(plan, executor=None, journal=None):
+    """
+    Runs the steps of the plan that aren't done according to the journal. Steps whose
+    requirements are done are run together on the executor. If a step fails, the
+    steps running alongside it are finished and the first exception is raised. The
+    journal is only kept if a step is done by then, otherwise there's nothing to resume.
+    """
+    done = set(journal.start(plan)) if journal is not None else set()
+    remaining = [step for step in plan.steps.values() if step.name not in done]
+    while remaining:
+        ready = [step for step in remaining if all(required in done for required in step.requires)]
+        for step in ready:
+            print(step.description)
+        if executor is not None and len(ready) > 1:
+            results = [_outcome(future.result) for future in
+                       [executor.submit(step.action) for step in ready]]
+        else:
+            results = []
+            for step in ready:
+                results.append(_outcome(step.action))
+                if results[-1] is not None:
+                    break
+        error = None
+        for step, result in zip(ready, results):
+            if result is None:
+                done.add(step.name)
+                if journal is not None:
+                    journal.record(step.name)
+            elif error is None:
+                error = result
+        if error is not None:
+            if journal is not None and not done:
+                journal.finish()
+            raise error[0], error[1], error[2]
+        remaining = [step for step in remaining if step.name not in done]
+    if journal is not None:
+        journal.finish()
+
+
+def _outcome(fn):
+    """Calls fn. Returns None if it succeeds, the exception info if it raises"""
+    try:
+        fn()
+    except Exception:
+        return sys.exc_info()
+    return None
+
+
+class Journal:
+    """
+    The steps of a plan that are done, in a JSON file. There's at most one unfinished
+    plan in a journal. The file is written when the first step is done.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._state = None
+
+    def pending(self):
+        """Returns the key, params and done steps of an unfinished plan, or None"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def start(self, plan):
+        """Starts journaling the plan. Returns the names of its steps that are done already"""
+        pending = self.pending()
+        if pending is not None and pending["key"] == plan.key:
+            self._state = pending
+        else:
+            self._state = {"key": plan.key, "params": plan.params, "done": []}
+        return self._state["done"]
+
+    def record(self, step_name):
+        self._state["done"].append(step_name)
+        self._write()
+
+    def finish(self):
+        """Forgets the plan, it's done"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._state = None
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.rename(tmp_path, self.path)
+
+
+class PlanException(Exception):
+    pass
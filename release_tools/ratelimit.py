@@ -0,0 +1,132 @@
+"""
+Scheduling of api calls within Github's rate limits.
+
+Every response reports how many calls are left until the limit is reset. The
+RateLimiter keeps track of that for everything using the same transport, and
+holds calls back instead of letting them fail:
+
+* When the limit is used up, calls wait until it's reset.
+* Low priority calls (reads that only report, like the release history or the
+  pull request counts of the status) also wait when only the reserve is left, so
+  that commands that write, like accept, still have calls left for that.
+* No more calls are in flight than there are calls left, and after a secondary
+  rate limit (a Retry-After response to too many concurrent calls) fewer calls
+  are let through at the same time, growing back as calls succeed.
+"""
+from __future__ import print_function
+import threading
+import time
+
+LOW = 0
+NORMAL = 1
+
+DEFAULT_RESERVE = 100
+# Github asks to wait at least a minute after a secondary rate limit without Retry-After
+DEFAULT_RETRY_AFTER = 60
+RATE_LIMITED_STATUS_CODES = frozenset([403, 429])
+
+
+class RateLimiter:
+    def __init__(self, max_concurrency=10, reserve=DEFAULT_RESERVE):
+        """
+        max_concurrency: The most calls in flight at the same time
+        reserve: Calls left that only normal priority calls may use
+        """
+        self.max_concurrency = max_concurrency
+        self.reserve = reserve
+        # As last reported by the api. Unknown until the first response
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.blocked_until = 0
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, priority=NORMAL):
+        """Waits until a call with the priority may be made. Must be followed by release()"""
+        with self._condition:
+            announced = False
+            while True:
+                wait = self._wait_time(priority)
+                if wait == 0:
+                    self.in_flight += 1
+                    return
+                if wait is not None and wait > 1 and not announced:
+                    print("Rate limited, waiting until {}".format(
+                        time.strftime("%H:%M:%S", time.localtime(time.time() + wait))))
+                    announced = True
+                # Without a time, wait for a call in flight to finish. Waiting with a timeout
+                # keeps Ctrl-C working in Python 2
+                self._condition.wait(min(wait, 1) if wait is not None else 1)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def update(self, response):
+        """
+        Takes the rate limit from the response headers. Returns True if the call was
+        rejected because of the rate limit, it can then be made again after acquire().
+        """
+        headers = response.headers
+        now = time.time()
+        with self._condition:
+            remaining = headers.get("X-RateLimit-Remaining")
+            if remaining is not None:
+                reset = int(headers.get("X-RateLimit-Reset", 0))
+                # Concurrent responses can arrive out of order, and within one reset
+                # period the calls left only go down
+                if reset == self.reset:
+                    self.remaining = min(self.remaining, int(remaining))
+                else:
+                    self.remaining = int(remaining)
+                self.reset = reset
+                if "X-RateLimit-Limit" in headers:
+                    self.limit = int(headers["X-RateLimit-Limit"])
+            limited = response.status_code in RATE_LIMITED_STATUS_CODES and \
+                (remaining == "0" or "Retry-After" in headers)
+            if limited:
+                retry_after = headers.get("Retry-After")
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, now + int(retry_after))
+                elif self.reset is None or self.reset <= now:
+                    self.blocked_until = max(self.blocked_until, now + DEFAULT_RETRY_AFTER)
+                if retry_after is not None or remaining != "0":
+                    # A secondary limit, which is about concurrency
+                    self.concurrency = max(1.0, self.concurrency / 2)
+            else:
+                self.concurrency = min(float(self.max_concurrency),
+                                       self.concurrency + 1 / self.concurrency)
+            self._condition.notify_all()
+        return limited
+
+    def exhausted(self):
+        return self.remaining == 0 and self.reset > time.time()
+
+    def _reserve(self):
+        # Never more than a tenth of the limit, unauthenticated calls only have 60 an hour
+        if self.limit is None:
+            return self.reserve
+        return min(self.reserve, self.limit // 10)
+
+    def _wait_time(self, priority):
+        """
+        Seconds to wait before the call can be made, 0 if it can be made now, or None
+        if it has to wait for a call in flight
+        """
+        now = time.time()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        allowed = int(self.concurrency)
+        if self.remaining is not None and self.reset > now:
+            left = self.remaining - self.in_flight
+            if left <= 0 and self.in_flight == 0:
+                return self.reset - now
+            if priority == LOW and left <= self._reserve():
+                return self.reset - now
+            allowed = min(allowed, self.remaining)
+        if self.in_flight >= max(allowed, 1):
+            return None
+        return 0
@@ -0,0 +1,89 @@
+"""
+Resolution of refs to commit shas.
+
+A RefResolver answers lookups from a dict. It's filled with all refs at once when
+they're known anyway (e.g. from the branch list), or one ref at a time with the
+single-ref endpoint, so resolving a ref never lists all heads again.
+"""
+import re
+
+SHA_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+# The namespaces a short ref name is looked up in, in the order git uses
+NAMESPACES = ("refs/heads/", "refs/tags/")
+
+
+class RefResolver:
+    def __init__(self, provider):
+        """
+        provider: Has get_ref(ref), and get_refs(prefix) for load_all. A provider that
+                  answers get_ref from a local copy also has get_remote_ref(ref), which
+                  verify uses.
+        """
+        self.provider = provider
+        self._shas = dict()
+        self._complete = False
+
+    def load(self, refs):
+        """Adds (full ref name, sha) pairs"""
+        self._shas.update(refs)
+
+    def load_branches(self, branches):
+        """Adds the branches, as returned by the provider's get_branches"""
+        self.load(("refs/heads/" + branch["name"], branch["commit"]["sha"]) for branch in branches)
+
+    def load_all(self):
+        """Lists all refs once, after which refs that aren't in the dict don't exist"""
+        self.load((ref["ref"], ref["object"]["sha"]) for ref in self.provider.get_refs(""))
+        self._complete = True
+
+    def resolve(self, ref):
+        """
+        Returns the sha of a ref, which can be a full ref name (refs/heads/master), a
+        branch or tag name, or a sha. Raises RefException if it doesn't exist.
+        """
+        if SHA_PATTERN.match(ref):
+            return ref
+        candidates = [ref] if ref.startswith("refs/") else [namespace + ref for namespace in NAMESPACES]
+        for candidate in candidates:
+            if candidate in self._shas:
+                return self._shas[candidate]
+        if not self._complete:
+            for candidate in candidates:
+                sha = self.provider.get_ref(candidate)
+                if sha is not None:
+                    self._shas[candidate] = sha
+                    return sha
+        raise RefException("No ref named '{}'".format(ref))
+
+    def verify(self, ref):
+        """
+        Checks, before writing, that the ref still points where it did when it was
+        resolved. Raises StaleRefException if it has moved. Returns the sha.
+        """
+        full_ref = ref if ref.startswith("refs/") else "refs/heads/" + ref
+        known = self._shas.get(full_ref)
+        # A local copy may be as old as what's being verified
+        get_ref = getattr(self.provider, "get_remote_ref", self.provider.get_ref)
+        current = get_ref(full_ref)
+        if current is None:
+            raise RefException("No ref named '{}'".format(ref))
+        self._shas[full_ref] = current
+        if known is not None and known != current:
+            raise StaleRefException("'{}' has moved from {} to {}".format(ref, known, current))
+        return current
+
+    def invalidate(self, ref=None):
+        """Forgets the ref, or all refs, after a write that may have moved it"""
+        if ref is None:
+            self._shas.clear()
+        else:
+            self._shas.pop(ref if ref.startswith("refs/") else "refs/heads/" + ref, None)
+        self._complete = False
+
+
+class RefException(Exception):
+    pass
+
+
+class StaleRefException(RefException):
+    pass
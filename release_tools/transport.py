@@ -0,0 +1,175 @@
+"""
+Shared HTTP transport used by the providers.
+
+All api calls go through one pooled requests.Session so that connections
+(and TLS sessions) are kept alive between calls instead of being set up again
+for every request.
+"""
+from __future__ import print_function
+import random
+import time
+import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from release_tools.cache import CachedResponse
+from release_tools.instrumentation import ApiCall
+from release_tools.ratelimit import RateLimiter, NORMAL
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+
+class Transport(object):
+    """
+    A pooled, keep-alive HTTP session with retries.
+
+    Idempotent requests are retried on 5xx responses and on connection errors,
+    with exponential backoff and jitter. Requests that aren't idempotent (e.g. POSTs
+    that merge or create pull requests) are only retried if the caller explicitly
+    marks them as safe to retry.
+
+    If a ResponseCache is set, GETs are served from it or revalidated against it.
+
+    Calls are scheduled by a RateLimiter: they wait for the rate limit to be reset
+    instead of failing, and calls that were rejected by it are sent again.
+
+    Each hook in hooks is called with an ApiCall after every GET and POST.
+    """
+    def __init__(self, pool_size=10, max_retries=3, backoff_factor=0.5, timeout=30, cache=None,
+                 limiter=None, priority=NORMAL):
+        """
+        limiter: The RateLimiter, shared by everything using this transport. A new one
+                 is created if not set
+        priority: The priority of calls that don't set one, LOW or NORMAL
+        """
+        self.cache = cache
+        self.hooks = []
+        self.limiter = limiter or RateLimiter(max_concurrency=pool_size)
+        self.priority = priority
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate",
+                                     "Connection": "keep-alive"})
+        # Retries are handled in request(), so the adapter itself must not retry
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, cache=True, endpoint=None, **kwargs):
+        """
+        cache: Set to False to bypass the response cache, e.g. for downloads
+        endpoint: The url template the hooks see, like /repos/{owner}/{repo}/pulls.
+                  Defaults to the path of the url
+        """
+        started = time.time()
+        response, cache_status = self._get(url, cache, **kwargs)
+        self._call_hooks("GET", url, endpoint, response, started, cache_status, kwargs.get("stream"))
+        return response
+
+    def post(self, url, endpoint=None, **kwargs):
+        started = time.time()
+        response = self.request("POST", url, **kwargs)
+        self._call_hooks("POST", url, endpoint, response, started)
+        return response
+
+    def _get(self, url, cache, **kwargs):
+        """Returns the response and whether it came from the cache"""
+        if not self.cache or not cache or kwargs.get("stream"):
+            return self.request("GET", url, **kwargs), None
+
+        accept = (kwargs.get("headers") or {}).get("Accept")
+        key = self.cache.key(url, kwargs.get("params"), accept)
+        entry = self.cache.lookup(key)
+        if entry and self.cache.is_fresh(entry):
+            return CachedResponse(entry), "hit"
+        if entry:
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers.update(self.cache.conditional_headers(entry))
+            kwargs["headers"] = headers
+
+        response = self.request("GET", url, **kwargs)
+        if entry and response.status_code == 304:
+            self.cache.refresh(key, entry)
+            return CachedResponse(entry), "revalidated"
+        if response.status_code == 200:
+            self.cache.store(key, response)
+        return response, "miss"
+
+    def _call_hooks(self, method, url, endpoint, response, started, cache_status=None, stream=False):
+        if not self.hooks:
+            return
+        if stream:
+            # Reading the size would read the body
+            length = response.headers.get("Content-Length")
+            size = int(length) if length is not None else None
+        else:
+            size = len(response.content)
+        call = ApiCall(endpoint or urlparse.urlparse(url).path, method, response.status_code,
+                       size, started, time.time() - started, cache_status)
+        for hook in self.hooks:
+            hook(call)
+
+    def request(self, method, url, idempotent=None, priority=None, **kwargs):
+        """
+        Sends the request, retrying it if that's safe.
+
+        idempotent: Set to True for a non-idempotent method (like POST) that can safely
+                    be resent. Defaults to whatever the HTTP method implies.
+        priority: LOW for reads that may wait so that writes keep their share of the
+                  rate limit. Defaults to the priority of the transport
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if priority is None:
+            priority = self.priority
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response, rate_limited = self._send(method, url, priority, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+            else:
+                if rate_limited:
+                    # Rejected without being handled, so even a POST can be sent again
+                    response.close()
+                    continue
+                if not idempotent or attempt >= self.max_retries or \
+                        response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                response.close()
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _send(self, method, url, priority, **kwargs):
+        """
+        Sends the request when the rate limit allows it. Returns the response and
+        whether it was rejected because of the rate limit
+        """
+        self.limiter.acquire(priority)
+        try:
+            response = self.session.request(method, url, **kwargs)
+            return response, self.limiter.update(response)
+        finally:
+            self.limiter.release()
+
+    @property
+    def rate_limit_remaining(self):
+        return self.limiter.remaining
+
+    @property
+    def rate_limit_reset(self):
+        return self.limiter.reset
+
+    def rate_limit_exhausted(self):
+        return self.limiter.exhausted()
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,92 @@
+"""
+Watching the queue for changes.
+
+Instead of running a command from cron every minute, one process keeps its workflow
+and polls the head of the queue. Polls revalidate the cached responses, so a poll that
+finds nothing new is answered with 304s. The interval doubles while nothing changes
+and drops back to the minimum when something does.
+"""
+from __future__ import print_function
+import time
+import traceback
+import requests
+from release_tools.github import GithubException
+from release_tools.localgit import LocalGitException
+from release_tools.workflow import WorkflowException
+
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 300
+# Errors that a later poll may not run into. Other errors are reported with their
+# traceback, but don't stop the watch either
+WATCH_ERRORS = (GithubException, WorkflowException, LocalGitException, requests.exceptions.RequestException)
+
+
+class Watcher:
+    def __init__(self, workflow, on_change, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, backoff=2, sleep=time.sleep):
+        """
+        on_change: Called with the branch and sha of the head of the queue whenever
+                   either of them changes. If it returns False or fails, it's called
+                   again after the next poll
+        """
+        self.workflow = workflow
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.sleep = sleep
+        self.interval = min_interval
+        self.head = None
+
+    def poll(self):
+        """Returns the branch and sha at the head of the queue, or (None, None) if it's empty"""
+        self.workflow.invalidate()
+        self.workflow.prefetch(pull_requests=False)
+        queue = self.workflow.get_queue()
+        if not queue:
+            return None, None
+        return queue[0], self.workflow.get_branch_sha(queue[0])
+
+    def check(self):
+        """Polls once, and calls on_change if the head has changed. Returns True if it has"""
+        try:
+            head = self.poll()
+        except WATCH_ERRORS as e:
+            print("Polling failed: {}".format(e))
+            return False
+        except Exception:
+            print("Polling failed:")
+            traceback.print_exc()
+            return False
+        if head == self.head:
+            return False
+        branch, sha = head
+        if branch is None:
+            print("The queue is empty")
+        else:
+            print("The head of the queue is now '{}' ({})".format(branch, sha))
+            try:
+                handled = self.on_change(branch, sha) is not False
+            except WATCH_ERRORS + (IOError, OSError) as e:
+                print("Handling '{}' failed: {}".format(branch, e))
+                handled = False
+            except Exception:
+                print("Handling '{}' failed:".format(branch))
+                traceback.print_exc()
+                handled = False
+            if not handled:
+                return True
+        self.head = head
+        return True
+
+    def run(self, polls=None):
+        """Polls until interrupted, or the given number of times"""
+        count = 0
+        while polls is None or count < polls:
+            if self.check():
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            count += 1
+            if polls is None or count < polls:
+                self.sleep(self.interval)
@@ -0,0 +1,259 @@
+"""
+A local model of repositories, kept up to date by Github webhooks.
+
+serve-webhooks reads the latest release, the branches and the open pull requests of
+each repository once, and from then on applies the create, delete, push, release and
+pull_request events that Github posts to it. The model is a JSON file per repository.
+Commands that only read answer from it through a WebhookStateProvider, without any
+api calls, for as long as the server runs. It removes the files when it stops, and
+a model whose server isn't running anymore, e.g. after a crash, isn't used.
+"""
+from __future__ import print_function
+import errno
+import hashlib
+import hmac
+import json
+import os
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from release_tools.github import GithubException
+
+DEFAULT_PORT = 8765
+BRANCH_REF_PREFIX = "refs/heads/"
+
+
+class RepoState:
+    """
+    The model of one repository in path. Open pull requests are kept by number with
+    their base, so an event that's delivered twice is only counted once. The model
+    has the pid of the server that keeps it up to date.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Returns the model, or None if the repository isn't being served"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def seed(self, provider):
+        """Reads the whole model from the provider, replacing the one on disk"""
+        state = {"pid": os.getpid(),
+                 "latest_tag_name": provider.get_latest_version_tag_name(),
+                 "branches": dict((branch["name"], branch["commit"]["sha"])
+                                  for branch in provider.get_branches()),
+                 "pull_requests": dict((str(pull_request["number"]), pull_request["base"]["ref"])
+                                       for pull_request in provider.get_pull_requests())}
+        self._write(state)
+
+    def apply(self, event, payload):
+        """Applies a webhook event. Returns True if it changed the model"""
+        state = self.load()
+        apply_event = EVENTS.get(event)
+        if state is None or apply_event is None:
+            return False
+        before = json.dumps(state, sort_keys=True)
+        apply_event(state, payload)
+        if json.dumps(state, sort_keys=True) == before:
+            return False
+        self._write(state)
+        return True
+
+    def complete(self, provider):
+        """
+        Reads what the events didn't tell from the provider: the latest release after
+        it has been deleted, and the commit of a branch whose push hasn't arrived yet
+        """
+        state = self.load()
+        if state is None:
+            return
+        if state["latest_tag_name"] is None:
+            state["latest_tag_name"] = provider.get_latest_version_tag_name()
+        for name, sha in state["branches"].items():
+            if sha is None:
+                state["branches"][name] = provider.get_ref(BRANCH_REF_PREFIX + name)
+        self._write(state)
+
+    def get_repo_state(self):
+        """
+        Returns the model like a provider's get_repo_state, or None if it isn't complete
+        or its server isn't running
+        """
+        state = self.load()
+        if state is None or not _is_running(state.get("pid")):
+            return None
+        if state["latest_tag_name"] is None or None in state["branches"].values():
+            return None
+        counts = dict()
+        for base in state["pull_requests"].values():
+            counts[base] = counts.get(base, 0) + 1
+        return {"latest_tag_name": state["latest_tag_name"],
+                "branches": [{"name": name, "commit": {"sha": sha}}
+                             for name, sha in sorted(state["branches"].items())],
+                "pull_request_counts": counts}
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _write(self, state):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp_path, self.path)
+
+
+def _is_running(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM: The process exists, but belongs to another user
+        return e.errno == errno.EPERM
+    return True
+
+
+def _apply_create(state, payload):
+    # The commit isn't in the event, it comes with the push that follows
+    if payload["ref_type"] == "branch":
+        state["branches"].setdefault(payload["ref"], None)
+
+
+def _apply_delete(state, payload):
+    if payload["ref_type"] == "branch":
+        state["branches"].pop(payload["ref"], None)
+
+
+def _apply_push(state, payload):
+    if not payload["ref"].startswith(BRANCH_REF_PREFIX):
+        return
+    name = payload["ref"][len(BRANCH_REF_PREFIX):]
+    if payload.get("deleted"):
+        state["branches"].pop(name, None)
+    else:
+        state["branches"][name] = payload["after"]
+
+
+def _apply_release(state, payload):
+    release = payload["release"]
+    if payload["action"] in ("published", "released"):
+        if not release["draft"] and not release["prerelease"]:
+            state["latest_tag_name"] = release["tag_name"]
+    elif payload["action"] in ("deleted", "unpublished", "prereleased"):
+        # Which release is the latest now is only known to Github
+        if release["tag_name"] == state["latest_tag_name"]:
+            state["latest_tag_name"] = None
+
+
+def _apply_pull_request(state, payload):
+    pull_request = payload["pull_request"]
+    number = str(pull_request["number"])
+    if pull_request["state"] == "open":
+        state["pull_requests"][number] = pull_request["base"]["ref"]
+    else:
+        state["pull_requests"].pop(number, None)
+
+
+EVENTS = {"create": _apply_create,
+          "delete": _apply_delete,
+          "push": _apply_push,
+          "release": _apply_release,
+          "pull_request": _apply_pull_request}
+
+
+def verify_signature(secret, body, signature):
+    """Checks the X-Hub-Signature-256 header of a delivery against the webhook's secret"""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+class WebhookServer(HTTPServer):
+    """
+    Applies the deliveries to the models of the repositories. Deliveries are handled
+    one at a time, so the models are never written concurrently.
+    """
+    def __init__(self, address, repos, secret=None):
+        """
+        repos: The RepoState and provider of each served repository, by 'owner/repo'.
+               The provider is used to complete the model.
+        secret: The secret of the webhooks. If set, deliveries without a valid
+                signature are rejected.
+        """
+        HTTPServer.__init__(self, address, WebhookHandler)
+        self.repos = repos
+        self.secret = secret
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        secret = self.server.secret
+        if secret is not None and not verify_signature(secret, body, self.headers.get("X-Hub-Signature-256")):
+            return self._respond(401, "Invalid signature")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._respond(400, "Invalid JSON")
+        event = self.headers.get("X-GitHub-Event")
+        full_name = (payload.get("repository") or {}).get("full_name")
+        if full_name not in self.server.repos:
+            return self._respond(202, "Not serving this repository")
+        state, provider = self.server.repos[full_name]
+        if state.apply(event, payload):
+            print("Applied {} to {}".format(event, full_name))
+            try:
+                state.complete(provider)
+            except GithubException as e:
+                print("Completing {} failed: {}".format(full_name, e))
+        self._respond(204)
+
+    def _respond(self, status_code, message=None):
+        self.send_response(status_code)
+        if message is not None:
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(message)))
+        self.end_headers()
+        if message is not None:
+            self.wfile.write(message)
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookStateProvider(object):
+    """
+    Looks like the provider it wraps, but reads the latest release and the branches
+    from the model that serve-webhooks keeps, while it has them. Everything else is
+    passed on.
+    """
+    def __init__(self, provider, state):
+        self.provider = provider
+        self.state = state
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def get_repo_state(self):
+        repo_state = self.state.get_repo_state()
+        if repo_state is None and hasattr(self.provider, "get_repo_state"):
+            return self.provider.get_repo_state()
+        return repo_state
+
+    def get_latest_version_tag_name(self):
+        repo_state = self.state.get_repo_state()
+        if repo_state is None:
+            return self.provider.get_latest_version_tag_name()
+        return repo_state["latest_tag_name"]
+
+    def get_branches(self):
+        repo_state = self.state.get_repo_state()
+        if repo_state is None:
+            return self.provider.get_branches()
+        return repo_state["branches"]
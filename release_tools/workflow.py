@@ -7,7 +7,15 @@
 import sys
 import os
 import re
+from bisect import bisect_left, bisect_right
+from release_tools.archive import extract_atomically, DEFAULT_WORKERS
+from release_tools.compare import compare_branches
+from release_tools.concurrency import AsyncProvider, gather
+from release_tools.delta import patch_tree, DeltaException
 from release_tools.github import MergeException
+from release_tools.history import TextRenderer
+from release_tools.plan import Plan, execute
+from release_tools.refs import RefResolver, StaleRefException
 
 MASTER_BRANCH = "master"
 DEVELOP_BRANCH = "develop"
@@ -20,14 +28,95 @@ class Workflow:
     Methods that have to do directly with the deployment workflow
     but who could work with different providers that look like the GithubProvider
     """
-    def __init__(self, provider, conventions, whatif):
+    def __init__(self, provider, conventions, whatif, artifact_cache=None, executor=None,
+                 comparison_cache=None, journal=None):
+        """
+        artifact_cache: An ArtifactCache for downloaded trees. If not set, every
+                        download fetches the whole archive.
+        executor: An Executor for reading from the provider concurrently. If not set,
+                  everything is read sequentially, when it's needed.
+        comparison_cache: A ComparisonCache for the ahead/behind counts of branches. If
+                          not set, the branches are compared every time.
+        journal: A Journal of the writes, so a command that stops halfway can be resumed.
+                 If not set, a failed command has to be finished by hand.
+        """
         self.provider = provider
         self.conventions = conventions
         self.whatif = whatif
+        self.artifact_cache = artifact_cache
+        self.executor = executor
+        self.comparison_cache = comparison_cache
+        self.journal = journal
+        self._snapshot = None
+        self._refs = None
+
+    def snapshot(self):
+        """
+        Returns the snapshot of the repository that this command reads from.
+        It's loaded lazily and kept until it's invalidated by a write.
+        """
+        if self._snapshot is None:
+            self._snapshot = RepoSnapshot(self.provider)
+        return self._snapshot
+
+    def invalidate(self):
+        """
+        Drops the snapshot, so the state is read again from the provider. Providers
+        that keep a copy of the repository (see LocalGitProvider) have an invalidate
+        method, which is called too.
+        """
+        self._snapshot = None
+        self._refs = None
+        if hasattr(self.provider, "invalidate"):
+            self.provider.invalidate()
+
+    def refs(self):
+        """
+        Returns the RefResolver of this command. It knows the branches of the snapshot,
+        other refs are looked up one by one.
+        """
+        if self._refs is None:
+            self._refs = RefResolver(self.provider)
+            self._refs.load_branches(self.snapshot().get_branches())
+        return self._refs
+
+    def prefetch(self, pull_requests=True):
+        """
+        Loads the snapshot, running the independent reads together: first the latest
+        release and the branches, then the pull requests to each branch in the queue.
+
+        Providers that can read all of it at once (see GraphQLGithubProvider) have a
+        get_repo_state method, which is used instead when it's available.
+        """
+        if hasattr(self.provider, "get_repo_state"):
+            state = self.provider.get_repo_state()
+            if state is not None:
+                self.snapshot().set_state(state)
+                return
+        if self.executor is None:
+            return
+        provider = AsyncProvider(self.provider, self.executor)
+        self.snapshot().prefetch(provider)
+        if pull_requests:
+            self.snapshot().prefetch_pull_requests(provider, self.get_queue())
 
     def get_latest_version(self):
-        tag_name = self.provider.get_latest_version_tag_name()
-        return self.conventions.get_version_from_tag(tag_name)
+        return self.conventions.get_version_from_tag(self.get_latest_tag_name())
+
+    def get_latest_tag_name(self):
+        return self.snapshot().get_latest_tag_name()
+
+    def get_branch_names(self):
+        return self.snapshot().get_branch_names()
+
+    def get_branch_sha(self, branch):
+        return self.snapshot().get_branch_sha(branch)
+
+    def get_pull_request_count(self, branch):
+        return self.snapshot().get_pull_request_count(branch)
+
+    def has_pull_requests(self, branch):
+        return self.get_pull_request_count(branch) > 0
 
     def get_candidate_version(self, major_inc=False):
         return self.get_latest_version().inc_major() if major_inc \
@@ -55,17 +144,20 @@ class Workflow:
         The next step is to create a pull request from develop to the new release branch.
         This branch should then be code reviewed and eventually merged.
         """
-        candidate_branch = self.get_candidate_branch(major_inc=major_inc)
-
-        print "Creating a new branch, '{}' from master".format(candidate_branch)
-        if not self.whatif:
-            self.provider.create_branch_from_master(candidate_branch)
-
+        params = self._pending_plan("create-cand") or \
+            {"command": "create-cand", "branch": self.get_candidate_branch(major_inc=major_inc)}
+        self.run_plan(self.plan_release_candidate(params["branch"]))
+
+    def plan_release_candidate(self, candidate_branch):
+        plan = Plan("create-cand {}".format(candidate_branch),
+                    {"command": "create-cand", "branch": candidate_branch})
+        plan.add("branch", "Creating a new branch, '{}' from master".format(candidate_branch),
+                 lambda: self.provider.create_branch_from_master(candidate_branch))
         # Merge from 'develop' into the new release branch:
         msg = "Merging from {} to {}".format(DEVELOP_BRANCH, candidate_branch)
-        print msg
-        if not self.whatif:
-            self.provider.merge(candidate_branch, DEVELOP_BRANCH, msg)
+        plan.add("merge", msg, lambda: self.provider.merge(candidate_branch, DEVELOP_BRANCH, msg),
+                 requires=["branch"])
+        return plan
 
     def create_hotfix(self):
         """
@@ -74,14 +166,30 @@ class Workflow:
         Hotfix branches are treated similar to release branches, except the patch number
         has been increased instead and they are before the release in the deployment pipeline.
         """
-        hotfix_branch = self.get_hotfix_branch()
-        print "Creating a new hotfix branch, '{}' from master".format(hotfix_branch)
-        if not self.whatif:
-            self.provider.create_branch_from_master(hotfix_branch)
+        params = self._pending_plan("create-hotfix") or \
+            {"command": "create-hotfix", "branch": self.get_hotfix_branch()}
+        hotfix_branch = params["branch"]
+        plan = Plan("create-hotfix {}".format(hotfix_branch), params)
+        plan.add("branch", "Creating a new hotfix branch, '{}' from master".format(hotfix_branch),
+                 lambda: self.provider.create_branch_from_master(hotfix_branch))
+        self.run_plan(plan)
 
         print "Not merging automatically into a hotfix - hotfix patches should be sent as pull requests to it"
 
-    def download_next_in_queue(self, path, force):
+    def download_next_in_queue(self, path, force, workers=None, delta_base=None, path_filter=None,
+                               delta=False):
+        """
+        Downloads the first branch in the queue to path/branch. With force, an existing
+        download is replaced when the new one has been completely extracted.
+
+        delta_base: A ref, e.g. the latest release tag, whose tree is in the artifact cache.
+                    If set, only the files that have changed since are downloaded.
+        path_filter: A PathFilter selecting the files to download. All files if not set.
+        delta: If set without delta_base, only the files that have changed since the newest
+               tree of the branch in the artifact cache are downloaded, or since the latest
+               release if there is none.
+        """
+        self.prefetch(pull_requests=False)
         queue = self.get_queue()
         if len(queue) > 1:
             print "There are more than one items in the queue. Downloading the first item."
@@ -91,14 +199,86 @@ class Workflow:
         if not force and os.path.exists(full_path):
             print "There already exists a directory for the build at '{}'. Please specify a non-existing path or --force.".format(full_path)
             sys.exit(1)
-        print "Downloading and extracting '{}' to '{}'. This may take a few seconds...".format(branch, full_path)
-        if not self.whatif:
-            self.provider.download_archive(branch, full_path)
+        if self.whatif:
+            print "Downloading and extracting '{}' to '{}'".format(branch, full_path)
+            return
+
+        if self.artifact_cache is None:
+            if delta or delta_base:
+                print "Delta downloads need the artifact cache, downloading the whole archive"
+            print "Downloading and extracting '{}' to '{}'. This may take a few seconds...".format(branch, full_path)
+            self._download_archive(branch, full_path, workers, path_filter)
+            return
+
+        # The cache is keyed by the commit, which is also what's downloaded, so the
+        # branch moving in between can't put the wrong tree in the cache
+        sha = self.get_branch_sha(branch)
+        key = self._artifact_key(sha, path_filter)
+        if self.artifact_cache.lookup(key) is None:
+            if delta and delta_base is None:
+                # The tag is on master, whose tree is only cached if master was downloaded
+                delta_base = self._cached_delta_base(branch, path_filter) or self.get_latest_tag_name()
+            if delta_base is None or not self._download_delta(delta_base, branch, sha, workers, path_filter):
+                print "Downloading and extracting '{}' ({}). This may take a few seconds...".format(branch, sha)
+                self.artifact_cache.store(
+                    key, lambda tree_path: self._download_archive(sha, tree_path, workers, path_filter),
+                    branch=branch, sha=sha)
+        else:
+            print "Found '{}' ({}) in the artifact cache".format(branch, sha)
+        print "Linking '{}' to '{}'".format(branch, full_path)
+        self.artifact_cache.materialize(key, full_path)
 
-    def download_release_history(self, path):
+    @staticmethod
+    def _artifact_key(sha, path_filter):
+        """Trees downloaded with different filters are cached separately"""
+        if path_filter is None or not path_filter.is_active():
+            return sha
+        return "{}-{}".format(sha, path_filter.digest())
+
+    def _download_archive(self, ref, path, workers, path_filter):
+        kwargs = dict()
+        if workers:
+            kwargs["workers"] = workers
+        if path_filter is not None and path_filter.is_active():
+            kwargs["path_filter"] = path_filter
+        self.provider.download_archive(ref, path, **kwargs)
+
+    def _cached_delta_base(self, branch, path_filter):
+        """The commit of the newest tree of branch in the artifact cache, downloaded with the same filter"""
+        meta = self.artifact_cache.newest(
+            branch, lambda meta: meta["key"] == self._artifact_key(meta["sha"], path_filter))
+        return meta["sha"] if meta is not None else None
+
+    def _download_delta(self, base_ref, branch, sha, workers, path_filter):
+        """
+        Builds the tree of sha, the head of branch, in the artifact cache from the cached
+        tree of base_ref, downloaded with the same filter. Returns False if that's not possible.
+        """
+        base_sha = self.refs().resolve(base_ref)
+        base_tree = self.artifact_cache.lookup(self._artifact_key(base_sha, path_filter))
+        if base_tree is None:
+            print "'{}' ({}) is not in the artifact cache, can't download a delta".format(base_ref, base_sha)
+            return False
+
+        def patch(path):
+            fetched = patch_tree(self.provider, base_tree, base_sha, sha, path,
+                                 workers or DEFAULT_WORKERS, path_filter)
+            print "Fetched {} changed files".format(fetched)
+
+        print "Downloading the changes from '{}' ({}) to {}".format(base_ref, base_sha, sha)
+        try:
+            self.artifact_cache.store(self._artifact_key(sha, path_filter),
+                                      lambda tree_path: extract_atomically(tree_path, patch),
+                                      branch=branch, sha=sha)
+        except DeltaException as e:
+            print "Can't download a delta: {}".format(e)
+            return False
+        return True
+
+    def download_release_history(self, path, incremental=False, renderer=TextRenderer):
         print "Downloading release history to {}".format(path)
         if not self.whatif:
-            self.provider.download_release_history(path)
+            self.provider.download_release_history(path, incremental, renderer)
 
     @staticmethod
     def get_hotfix_branches(branch_names):
@@ -119,21 +299,13 @@ class Workflow:
                 yield branch_name
 
     def get_pending_hotfix_branches(self, current_version, branch_names):
-        for branch in self.get_hotfix_branches(branch_names):
-            branch_version = Version.from_string(branch.split("-")[1])
-            if branch_version[0] == current_version[0] and \
-               branch_version[1] == current_version[1] and \
-               branch_version[2] > current_version[2]:
-                yield branch
+        return VersionIndex(branch_names, self.conventions).pending_hotfixes(current_version)
 
     def get_pending_release_branches(self, current_tag, branch_names):
-        for branch in self.get_release_branches(branch_names):
-            branch_version = Version.from_string(branch.split("-")[1])
-            if branch_version[0] > current_tag[0]:
-                yield branch
-            elif branch_version[0] == current_tag[0] and \
-                 branch_version[1] > current_tag[1]:
-                yield branch
+        return VersionIndex(branch_names, self.conventions).pending_releases(current_tag)
+
+    def get_version_index(self):
+        return self.snapshot().get_version_index(self.conventions)
 
     def get_queue(self):
         """
@@ -142,12 +314,11 @@ class Workflow:
 
         The hotfix branch will always come before the release branch
         """
-        branches = self.provider.get_branches()
-        branch_names = [branch["name"] for branch in branches]
+        index = self.get_version_index()
         current_version = self.get_latest_version()
 
-        pending_hotfixes = list(self.get_pending_hotfix_branches(current_version, branch_names))
-        pending_releases = list(self.get_pending_release_branches(current_version, branch_names))
+        pending_hotfixes = index.pending_hotfixes(current_version)
+        pending_releases = index.pending_releases(current_version)
 
         if len(pending_hotfixes) > 1:
             raise WorkflowException("Unexpected number of pending hotfixes: {}".format(len(pending_hotfixes)))
@@ -158,6 +329,23 @@ class Workflow:
         queue = pending_hotfixes + pending_releases
         return queue
 
+    def get_branch_comparisons(self):
+        """
+        Returns a BranchComparison for each merge the queue is waiting for: develop into
+        the release, the release into master, and the hotfix into develop and the release.
+        """
+        queue = self.get_queue()
+        releases = [branch for branch in queue if branch.startswith(RELEASE_BRANCH_PRE)]
+        hotfixes = [branch for branch in queue if branch.startswith(HOTFIX_BRANCH_PRE)]
+        merges = [(DEVELOP_BRANCH, release) for release in releases] + \
+                 [(release, MASTER_BRANCH) for release in releases] + \
+                 [(hotfix, DEVELOP_BRANCH) for hotfix in hotfixes] + \
+                 [(hotfix, release) for hotfix in hotfixes for release in releases]
+        branch_names = set(self.get_branch_names())
+        pairs = [(source, self.get_branch_sha(source), target, self.get_branch_sha(target))
+                 for source, target in merges if source in branch_names and target in branch_names]
+        return compare_branches(self.provider, pairs, self.comparison_cache, self.executor)
+
     def accept_release_candidate(self, force):
         """
         Accept the next item in the queue
@@ -166,25 +354,59 @@ class Workflow:
 
         If force is not set to True, the user will be prompted if more than one
         release is in the queue.
+
+        If an earlier accept stopped halfway, it's finished instead.
+        """
+        resumed = self._pending_plan("accept")
+        if resumed is not None and "tag" in self.journal.pending()["done"]:
+            # The release is tagged, only the pull requests are left
+            params = resumed
+        else:
+            params = self._prepare_accept(force, resumed)
+            if params is None:
+                return
+        try:
+            self.run_plan(self.plan_accept(params["branch"], params["next_release"], params.get("sha")))
+        except MergeException:
+            print "Merge exception while merging '{}' to '{}'. ".format(params["branch"], MASTER_BRANCH) + \
+                  "This can happen if there was a hotfix release in between."
+            sys.exit(1)
+
+    def _prepare_accept(self, force, resumed=None):
+        """
+        Reads the queue and checks that its first branch can be accepted. Returns what
+        the accept is planned from, or None if there's nothing to accept.
+
+        resumed: What an accept that stopped halfway was planned from. Its branch must
+                 still be first in the queue, and not have moved since.
         """
+        self.prefetch(pull_requests=False)
         queue = self.get_queue()
 
+        if resumed is not None and (len(queue) == 0 or queue[0] != resumed["branch"]):
+            print "Accepting '{}' stopped halfway, but it's no longer first in the queue.".format(resumed["branch"])
+            print "Finish it by hand and run accept with --discard-journal."
+            sys.exit(1)
+
         if len(queue) == 0:
             print "The queue is empty. Nothing to accept."
-            return
+            return None
 
         branch = queue[0]
 
         # TODO: Don't accept the release if it has a pull request.
         # That might be a hotfix waiting to be merged.
-        if self.provider.has_pull_requests(branch):
+        if self.has_pull_requests(branch):
             print "The branch being accepted has pull requests"
             print "which need to be resolved before accepting."
             sys.exit(1)
 
         next_release = None
 
-        if len(queue) > 1:
+        if resumed is not None:
+            # The branch to send a hotfix to was chosen when the accept was started
+            next_release = resumed["next_release"]
+        elif len(queue) > 1:
             print "There are more than one item in the queue:"
             for current in queue:
                 print "  {}".format(current)
@@ -195,44 +417,195 @@ class Workflow:
 
                 if accepted != "y":
                     print "Action cancelled by user"
-                    return
+                    return None
             else:
                 print "Force set to true. The first branch will automatically be accepted"
 
             next_release = queue[1]
 
-        def merge_cond(base, head):
-            msg = "Merging from '{}' to '{}'".format(head, base)
-            print msg
-            if not self.whatif:
-                try:
-                    self.provider.merge(base, head, msg)
-                except MergeException:
-                    print "Merge exception while merging '{}' to '{}'. ".format(head, base) + \
-                          "This can happen if there was a hotfix release in between."
-                    sys.exit(1)
+        # The pull requests were checked on the branch as it was in the snapshot, and
+        # there may have been a prompt since
+        try:
+            sha = self.refs().verify(branch)
+        except StaleRefException as e:
+            print "{}. Run accept again to check the new commits.".format(e)
+            sys.exit(1)
+        if resumed is not None and resumed.get("sha") not in (None, sha):
+            print "'{}' has moved from {} to {} since the accept stopped.".format(branch, resumed["sha"], sha)
+            print "Finish it by hand and run accept with --discard-journal."
+            sys.exit(1)
+        return {"command": "accept", "branch": branch, "next_release": next_release, "sha": sha}
+
+    def plan_accept(self, branch, next_release, sha=None):
+        """
+        Merges the branch into master and tags master. A hotfix is then also sent as
+        pull requests to develop and the next release, which don't depend on each other.
 
-        merge_cond(MASTER_BRANCH, branch)
+        sha: The commit of the branch that was checked, so a resumed accept can tell
+             whether it has moved since
+        """
+        plan = Plan("accept {}".format(branch),
+                    {"command": "accept", "branch": branch, "next_release": next_release, "sha": sha})
+        msg = "Merging from '{}' to '{}'".format(branch, MASTER_BRANCH)
+        plan.add("merge", msg, lambda: self.provider.merge(MASTER_BRANCH, branch, msg))
 
         tag_name = self.conventions.get_tag_from_branch(branch)
-        print "Tagging HEAD on {} as release {}".format(MASTER_BRANCH, tag_name)
-        if not self.whatif:
-            self.provider.tag_release(tag_name, MASTER_BRANCH)
+        plan.add("tag", "Tagging HEAD on {} as release {}".format(MASTER_BRANCH, tag_name),
+                 lambda: self.provider.tag_release(tag_name, MASTER_BRANCH), requires=["merge"])
 
         if branch.startswith("hotfix"):
             # We don't know if the dev needs this in 'develop' and in the next release, but it's likely
-            # so we send a pull request to those.
-            print "Hotfix branch merged - sending pull requests to develop and release"
-            print "These pull requests need to be reviewed and potential merge conflicts resolved"
-
-            msg = "Apply hotfix '{}' to '{}'".format(branch, DEVELOP_BRANCH)
+            # so we send pull requests to those. They need to be reviewed and potential merge
+            # conflicts resolved
             body = "Pull request was made automatically by release-tools"
-            self.provider.create_pull_request(DEVELOP_BRANCH, branch, msg, body)
+            targets = [DEVELOP_BRANCH] + ([next_release] if next_release else [])
+            for target in targets:
+                msg = "Apply hotfix '{}' to '{}'".format(branch, target)
+                plan.add("pull-request-" + target, "Sending a pull request: " + msg,
+                         lambda target=target, msg=msg: self.provider.create_pull_request(target, branch, msg, body),
+                         requires=["tag"])
+        return plan
+
+    def run_plan(self, plan):
+        """Prints the plan with whatif, and executes it otherwise"""
+        pending = self.journal.pending() if self.journal is not None else None
+        done = pending["done"] if pending is not None and pending["key"] == plan.key else []
+        if self.whatif:
+            print "Plan:"
+            for line in plan.describe(done):
+                print line
+            return
+        try:
+            execute(plan, self.executor, self.journal)
+        finally:
+            self.invalidate()
 
-            if next_release:
-                msg = "Apply hotfix '{}' to '{}'".format(branch, next_release)
-                body = "Pull request was made automatically by release-tools"
-                self.provider.create_pull_request(next_release, branch, msg, body)
+    def _pending_plan(self, command):
+        """
+        Returns the params of the command's plan if it stopped halfway, so it's resumed
+        instead of planned again. Raises WorkflowException if another command stopped halfway.
+        """
+        pending = self.journal.pending() if self.journal is not None else None
+        if pending is None:
+            return None
+        if pending["params"]["command"] != command:
+            raise WorkflowException("'{}' stopped halfway. Run {} again to finish it, or discard "
+                                    "its journal".format(pending["key"], pending["params"]["command"]))
+        print "Resuming '{}', which stopped after: {}".format(pending["key"], ", ".join(pending["done"]) or "nothing")
+        return pending["params"]
+
+    def discard_journal(self):
+        """Forgets a command that stopped halfway, after it has been finished by hand"""
+        if self.journal is not None:
+            self.journal.finish()
+
+
+class RepoSnapshot:
+    """
+    The state of a repository as seen by one command: the latest release tag,
+    the branches and the number of open pull requests per branch.
+
+    Each part is fetched from the provider the first time it's needed and never
+    again, so a command doesn't fetch the same resource twice.
+    """
+    def __init__(self, provider):
+        self.provider = provider
+        self._latest_tag_name = None
+        self._branches = None
+        self._pull_request_counts = dict()
+        self._version_index = None
+        self._branch_shas = None
+
+    def set_state(self, state):
+        """Loads the snapshot from a repo state, as returned by a provider's get_repo_state"""
+        self._latest_tag_name = state["latest_tag_name"]
+        self._branches = state["branches"]
+        self._version_index = None
+        self._branch_shas = None
+        counts = state["pull_request_counts"]
+        self._pull_request_counts = dict((branch["name"], counts.get(branch["name"], 0))
+                                         for branch in self._branches)
+
+    def prefetch(self, async_provider):
+        """Loads the latest release tag and the branches concurrently, if not loaded already"""
+        tag_name = async_provider.get_latest_version_tag_name() if self._latest_tag_name is None else None
+        branches = async_provider.get_branches() if self._branches is None else None
+        if tag_name is not None:
+            self._latest_tag_name = tag_name.result()
+        if branches is not None:
+            self._branches = branches.result()
+            self._version_index = None
+            self._branch_shas = None
+
+    def prefetch_pull_requests(self, async_provider, branches):
+        """Loads the number of pull requests to each of the branches concurrently"""
+        branches = [branch for branch in branches if branch not in self._pull_request_counts]
+        futures = [async_provider.get_pull_requests(branch) for branch in branches]
+        for branch, pull_requests in zip(branches, gather(*futures)):
+            self._pull_request_counts[branch] = len(pull_requests)
+
+    def get_latest_tag_name(self):
+        if self._latest_tag_name is None:
+            self._latest_tag_name = self.provider.get_latest_version_tag_name()
+        return self._latest_tag_name
+
+    def get_branches(self):
+        if self._branches is None:
+            self._branches = list(self.provider.get_branches())
+        return self._branches
+
+    def get_branch_names(self):
+        return [branch["name"] for branch in self.get_branches()]
+
+    def get_version_index(self, conventions):
+        if self._version_index is None:
+            self._version_index = VersionIndex(self.get_branch_names(), conventions)
+        return self._version_index
+
+    def get_branch_sha(self, branch_name):
+        if self._branch_shas is None:
+            self._branch_shas = dict((branch["name"], branch["commit"]["sha"]) for branch in self.get_branches())
+        if branch_name not in self._branch_shas:
+            raise WorkflowException("No branch named '{}'".format(branch_name))
+        return self._branch_shas[branch_name]
+
+    def get_pull_request_count(self, branch):
+        if branch not in self._pull_request_counts:
+            self._pull_request_counts[branch] = sum(1 for _ in self.provider.get_pull_requests(branch))
+        return self._pull_request_counts[branch]
+
+
+class VersionIndex:
+    """
+    The release and hotfix branches by version. Each branch name is parsed once, and
+    the branches are kept sorted by version so the pending ones are found by bisection.
+    Branches that don't follow the conventions, like release-notes, are left out.
+    """
+    def __init__(self, branch_names, conventions):
+        entries = dict([(RELEASE_BRANCH_PRE, []), (HOTFIX_BRANCH_PRE, [])])
+        for branch_name in branch_names:
+            parsed = conventions.get_version_from_branch(branch_name)
+            if parsed is not None and parsed[0] in entries:
+                prefix, version = parsed
+                entries[prefix].append((version, branch_name))
+        self._versions = dict()
+        self._branches = dict()
+        for prefix, prefix_entries in entries.items():
+            prefix_entries.sort()
+            self._versions[prefix] = [version for version, _ in prefix_entries]
+            self._branches[prefix] = [branch_name for _, branch_name in prefix_entries]
+
+    def pending_hotfixes(self, current_version):
+        """The hotfix branches after the version, with the same major and minor version"""
+        versions = self._versions[HOTFIX_BRANCH_PRE]
+        start = bisect_right(versions, current_version)
+        end = bisect_left(versions, current_version.inc_minor())
+        return self._branches[HOTFIX_BRANCH_PRE][start:end]
+
+    def pending_releases(self, current_version):
+        """The release branches with a higher major or minor version than the version"""
+        start = bisect_left(self._versions[RELEASE_BRANCH_PRE], current_version.inc_minor())
+        return self._branches[RELEASE_BRANCH_PRE][start:]
 
 
 class WorkflowException(Exception):
@@ -276,12 +649,27 @@ class Conventions:
     """
     Defines naming conventions between versions, tags and branches.
     """
+    TAG_PATTERN = re.compile(r"v(?P<major>\d+).(?P<minor>\d+).(?P<patch>\d+)")
+    BRANCH_PATTERN = re.compile(r"(?P<prefix>[^-]+)-(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)(-|$)")
+
     @staticmethod
     def get_version_from_tag(tag):
-        pattern = r"v(?P<major>\d+).(?P<minor>\d+).(?P<patch>\d+)"
-        m = re.match(pattern, tag)
+        m = Conventions.TAG_PATTERN.match(tag)
+        if m is None:
+            raise WorkflowException("The tag '{}' isn't named after a version like v1.2.3".format(tag))
         return Version(map(int, (m.group('major'), m.group('minor'), m.group('patch'))))
 
+    @staticmethod
+    def get_version_from_branch(branch_name):
+        """
+        Returns the prefix and version of a branch like release-1.3.0, or None if the
+        branch isn't named after a version
+        """
+        m = Conventions.BRANCH_PATTERN.match(branch_name)
+        if m is None:
+            return None
+        return m.group('prefix'), Version(map(int, (m.group('major'), m.group('minor'), m.group('patch'))))
+
     @staticmethod
     def get_branch_name_from_version(version, prefix):
         """Given a version tuple, returns a valid branch name"""
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Fakes shared by the unit tests
+
+import json
+
+API = "https://api.github.com/repos/owner/repo"
+BRANCHES = ["master", "develop", "release-1.3.0"]
+
+
+class FakeProvider:
+    """
+    Looks like the GithubProvider, but serves a fixed repository and counts the calls.
+    Each branch is at the commit sha-<name>, unless it has been moved. Tests that need
+    more, like writes or failures, subclass it.
+    """
+    def __init__(self, branch_names=None, tag_name="v1.2.0", pull_requests=None):
+        """pull_requests: The open pull requests, like the Github api but only with number and base"""
+        self.branch_names = list(BRANCHES if branch_names is None else branch_names)
+        self.tag_name = tag_name
+        self.pull_requests = pull_requests or []
+        self.shas = dict()
+        self.calls = []
+
+    def get_latest_version_tag_name(self):
+        self.calls.append("get_latest_version_tag_name")
+        return self.tag_name
+
+    def get_branches(self):
+        self.calls.append("get_branches")
+        return [{"name": name, "commit": {"sha": self.sha(name)}} for name in self.branch_names]
+
+    def get_pull_requests(self, base_branch=None):
+        self.calls.append("get_pull_requests")
+        return [pull_request for pull_request in self.pull_requests
+                if base_branch is None or pull_request["base"]["ref"] == base_branch]
+
+    def get_ref(self, ref):
+        self.calls.append("get_ref")
+        return self.sha(ref.split("/")[-1])
+
+    def sha(self, name):
+        return self.shas.get(name, "sha-" + name)
+
+    def move(self, name, sha):
+        """Moves the branch to sha, creating it if it doesn't exist"""
+        if name not in self.branch_names:
+            self.branch_names.append(name)
+        self.shas[name] = sha
+
+
+def pull_request(number, base):
+    return {"number": number, "base": {"ref": base}}
+
+
+class FakeResponse:
+    """
+    Looks like a requests.Response. The body is sent as JSON, unless the content is
+    given as it is.
+    """
+    def __init__(self, status_code=200, body=None, headers=None, url=API + "/branches", next_url=None,
+                 content=None):
+        if content is None:
+            content = "" if body is None else json.dumps(body)
+        self.status_code = status_code
+        self.content = content
+        self.text = content
+        self.headers = headers or {}
+        self.url = url
+        self.links = {"next": {"url": next_url}} if next_url else {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from release_tools.archive import DownloadProgress, download_to_file, extract_atomically, \
+    extract_zip, extract_tar_stream, ArchiveException, PathFilter
+
+
+class FakeStreamedResponse:
+    """A streamed response with the archive as its body"""
+    def __init__(self, content):
+        self.content = content
+        self.raw = io.BytesIO(content)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+def make_zip(files):
+    buf = io.BytesIO()
+    archive = zipfile.ZipFile(buf, "w")
+    for name, data in files.items():
+        archive.writestr(name, data)
+    archive.close()
+    return buf.getvalue()
+
+
+def make_tar(files):
+    buf = io.BytesIO()
+    archive = tarfile.open(fileobj=buf, mode="w:gz")
+    for name, data in files.items():
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    archive.close()
+    return buf.getvalue()
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.files = {"owner-repo-abc123/README.md": b"readme",
+                      "owner-repo-abc123/deploy/run.sh": b"echo" * 1000}
+        self.progress = DownloadProgress()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def assert_extracted(self):
+        for name, data in self.files.items():
+            with open(os.path.join(self.path, name), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_can_extract_zipball_in_parallel(self):
+        response = FakeStreamedResponse(make_zip(self.files))
+        archive_path = download_to_file(response, self.progress)
+        try:
+            extract_zip(archive_path, self.path, workers=2)
+        finally:
+            os.remove(archive_path)
+        self.assert_extracted()
+        self.assertEqual(self.progress.downloaded, len(response.content))
+
+    def test_can_extract_streamed_tarball(self):
+        response = FakeStreamedResponse(make_tar(self.files))
+        extract_tar_stream(response, self.path, self.progress)
+        self.assert_extracted()
+
+    def test_corrupt_member_is_detected(self):
+        content = make_zip({"owner-repo-abc123/data.txt": b"abcdefgh" * 100})
+        # zipfile stores the member uncompressed, so this changes the data but not the CRC
+        content = content.replace(b"abcdefgh", b"abcdefgX", 1)
+        response = FakeStreamedResponse(content)
+        archive_path = download_to_file(response, self.progress)
+        try:
+            self.assertRaises(zipfile.BadZipfile, extract_zip, archive_path, self.path)
+        finally:
+            os.remove(archive_path)
+
+    def test_failed_extraction_leaves_target_untouched(self):
+        target = os.path.join(self.path, "release-1.3.0")
+        os.mkdir(target)
+        open(os.path.join(target, "previous"), "w").close()
+
+        def fail(path):
+            open(os.path.join(path, "partial"), "w").close()
+            raise ArchiveException("Failed")
+        self.assertRaises(ArchiveException, extract_atomically, target, fail)
+        self.assertEqual(os.listdir(self.path), ["release-1.3.0"])
+        self.assertEqual(os.listdir(target), ["previous"])
+
+    def test_extraction_replaces_target(self):
+        target = os.path.join(self.path, "release-1.3.0")
+        os.mkdir(target)
+        open(os.path.join(target, "previous"), "w").close()
+        extract_atomically(target, lambda path: open(os.path.join(path, "new"), "w").close())
+        self.assertEqual(os.listdir(self.path), ["release-1.3.0"])
+        self.assertEqual(os.listdir(target), ["new"])
+
+
+    def test_only_included_members_are_extracted(self):
+        response = FakeStreamedResponse(make_zip(self.files))
+        archive_path = download_to_file(response, self.progress)
+        try:
+            extract_zip(archive_path, self.path, path_filter=PathFilter(include=["deploy"]))
+        finally:
+            os.remove(archive_path)
+        self.assertEqual(os.listdir(os.path.join(self.path, "owner-repo-abc123")), ["deploy"])
+
+    def test_excluded_members_are_skipped_in_stream(self):
+        response = FakeStreamedResponse(make_tar(self.files))
+        extract_tar_stream(response, self.path, self.progress, PathFilter(exclude=["*.md"]))
+        self.assertEqual(os.listdir(os.path.join(self.path, "owner-repo-abc123")), ["deploy"])
+
+
+class TestPathFilter(unittest.TestCase):
+    def test_pattern_matches_everything_below_a_directory(self):
+        path_filter = PathFilter(include=["deploy/", "config"])
+        self.assertTrue(path_filter.matches("deploy/scripts/run.sh"))
+        self.assertTrue(path_filter.matches("config/app.yml"))
+        self.assertFalse(path_filter.matches("src/config.py"))
+
+    def test_exclude_wins_over_include(self):
+        path_filter = PathFilter(include=["deploy/*"], exclude=["*.pyc"])
+        self.assertTrue(path_filter.matches("deploy/run.py"))
+        self.assertFalse(path_filter.matches("deploy/run.pyc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
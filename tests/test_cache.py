@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from fakes import FakeResponse
+from release_tools.cache import ResponseCache
+from release_tools.transport import Transport
+
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Tests that GETs are served from the cache and revalidated with conditional requests
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.directory, ttl=60)
+        self.transport = Transport(cache=self.cache)
+        self.sent_headers = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fake_session(self, *responses):
+        responses = list(responses)
+
+        def request(method, url, **kwargs):
+            self.sent_headers.append(kwargs.get("headers") or {})
+            return responses.pop(0)
+        self.transport.session.request = request
+
+    def test_fresh_entry_is_served_without_request(self):
+        self.fake_session(FakeResponse(200, [{"name": "develop"}], {"ETag": '"abc"'}))
+        self.transport.get("http://localhost/branches")
+        response = self.transport.get("http://localhost/branches")
+        self.assertEqual(response.json(), [{"name": "develop"}])
+        self.assertEqual(len(self.sent_headers), 1)
+
+    def test_stale_entry_is_revalidated(self):
+        self.cache.ttl = 0
+        self.fake_session(FakeResponse(200, [{"name": "develop"}], {"ETag": '"abc"'}),
+                          FakeResponse(304))
+        self.transport.get("http://localhost/branches")
+        response = self.transport.get("http://localhost/branches")
+        self.assertEqual(self.sent_headers[1]["If-None-Match"], '"abc"')
+        self.assertEqual(response.json(), [{"name": "develop"}])
+
+    def test_response_without_validators_is_not_stored(self):
+        self.fake_session(FakeResponse(200, []), FakeResponse(200, []))
+        self.transport.get("http://localhost/branches")
+        self.transport.get("http://localhost/branches")
+        self.assertEqual(len(self.sent_headers), 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.fake_session(FakeResponse(200, headers={"ETag": '"a"'}, url="http://localhost/a", content='a' * 100),
+                          FakeResponse(200, headers={"ETag": '"b"'}, url="http://localhost/b", content='b' * 100))
+        self.transport.get("http://localhost/a")
+        old = time.time() - 100
+        for name in os.listdir(self.directory):
+            os.utime(os.path.join(self.directory, name), (old, old))
+        self.cache.max_bytes = 250
+        self.transport.get("http://localhost/b")
+        self.assertIsNone(self.cache.lookup(ResponseCache.key("http://localhost/a")))
+        self.assertIsNotNone(self.cache.lookup(ResponseCache.key("http://localhost/b")))
+
+    def test_cache_is_only_listed_when_it_may_be_full(self):
+        self.fake_session(*[FakeResponse(200, headers={"ETag": '"x"'}, content='x' * 100) for _ in range(3)])
+        listed = []
+        listdir = os.listdir
+        os.listdir = lambda path: listed.append(path) or listdir(path)
+        try:
+            for name in ["a", "b", "c"]:
+                self.transport.get("http://localhost/" + name)
+        finally:
+            os.listdir = listdir
+        self.assertEqual(len(listed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import os
+import shutil
+import tempfile
+import unittest
+from fakes import FakeResponse, API
+from release_tools.cassette import RecordingTransport, ReplayTransport, CassetteException
+from release_tools.github import GithubProvider
+from release_tools.workflow import Workflow, Conventions
+
+
+class TestRecordReplay(unittest.TestCase):
+    """
+    Records a command against a fake session, then replays it without one
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.directory, "cassette.jsonl")
+        responses = {
+            API + "/releases/latest": FakeResponse(200, {"tag_name": "v1.2.0"}, url=API + "/releases/latest"),
+            API + "/branches": FakeResponse(
+                200, [{"name": "develop"}],
+                {"Link": "<{}/branches?access_token=secret&page=2>; rel=\"next\"".format(API)},
+                url=API + "/branches?access_token=secret&per_page=100"),
+            API + "/branches?page=2": FakeResponse(200, [{"name": "release-1.3.0"}], url=API + "/branches?page=2"),
+        }
+
+        def request(method, url, **kwargs):
+            # Only the page matters, the token is asserted to be left out of the cassette
+            path, _, query = url.partition("?")
+            return responses[path + ("?page=2" if "page=2" in query else "")]
+        transport = RecordingTransport(self.cassette)
+        transport.session.request = request
+        self.record(transport)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def record(transport):
+        provider = GithubProvider("owner", "repo", "secret", transport)
+        provider.get_latest_version_tag_name()
+        list(provider.get_branches())
+
+    def test_replay_serves_recorded_responses(self):
+        provider = GithubProvider("owner", "repo", "another-token", ReplayTransport(self.cassette))
+        workflow = Workflow(provider, Conventions, False)
+        self.assertEqual(workflow.get_queue(), ["release-1.3.0"])
+
+    def test_token_is_not_recorded(self):
+        with open(self.cassette) as f:
+            self.assertNotIn("secret", f.read())
+
+    def test_unrecorded_request_fails(self):
+        provider = GithubProvider("owner", "repo", None, ReplayTransport(self.cassette))
+        self.assertRaises(CassetteException, list, provider.get_pull_requests("develop"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import shutil
+import tempfile
+import threading
+import unittest
+from fakes import FakeProvider
+from release_tools.compare import ComparisonCache
+from release_tools.concurrency import Executor
+from release_tools.github import GithubException
+from release_tools.workflow import Workflow, Conventions
+
+
+class ComparingProvider(FakeProvider):
+    """Serves branches with the given shas. Comparisons count the differing letters"""
+    def __init__(self, shas):
+        FakeProvider.__init__(self, sorted(shas))
+        self.shas = shas
+        self.compared = []
+        self.lock = threading.Lock()
+
+    def compare(self, base, head):
+        with self.lock:
+            self.compared.append((base, head))
+        if base == "unrelated":
+            raise GithubException("No common ancestor")
+        return {"ahead_by": len(head), "behind_by": len(base), "files": []}
+
+
+class TestBranchComparisons(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ComparisonCache(self.directory)
+        self.executor = Executor(4)
+        self.provider = ComparingProvider({"master": "m", "develop": "dd", "release-1.3.0": "rrr",
+                                      "hotfix-1.2.1": "hhhh"})
+
+    def tearDown(self):
+        self.executor.close()
+        shutil.rmtree(self.directory)
+
+    def comparisons(self):
+        workflow = Workflow(self.provider, Conventions, False, executor=self.executor,
+                            comparison_cache=self.cache)
+        return [repr(comparison) for comparison in workflow.get_branch_comparisons()]
+
+    def test_queue_merges_are_compared(self):
+        self.assertEqual(self.comparisons(),
+                         ["develop -> release-1.3.0: 2 to merge, 3 behind",
+                          "release-1.3.0 -> master: 3 to merge, 1 behind",
+                          "hotfix-1.2.1 -> develop: 4 to merge, 2 behind",
+                          "hotfix-1.2.1 -> release-1.3.0: 4 to merge, 3 behind"])
+        self.assertEqual(len(self.provider.compared), 4)
+
+    def test_unmoved_branches_are_not_compared_again(self):
+        self.comparisons()
+        self.provider.compared = []
+        self.comparisons()
+        self.assertEqual(self.provider.compared, [])
+        self.provider.move("develop", "ddddd")
+        self.comparisons()
+        self.assertEqual(sorted(self.provider.compared), [("ddddd", "hhhh"), ("rrr", "ddddd")])
+
+    def test_failed_comparisons_are_reported_and_not_cached(self):
+        self.provider.branch_names.remove("hotfix-1.2.1")
+        self.provider.move("master", "unrelated")
+        self.assertEqual(self.comparisons()[1], "release-1.3.0 -> master: No common ancestor")
+        self.provider.compared = []
+        self.comparisons()
+        self.assertEqual(self.provider.compared, [("unrelated", "rrr")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# Tests for running commands in the daemon, over a socket in a temporary directory
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from StringIO import StringIO
+from release_tools import client
+from release_tools.cli import run_command
+from release_tools.daemon import serve, DaemonException
+
+
+class TestForwardedArgs(unittest.TestCase):
+    def test_commands_that_only_read_are_forwarded(self):
+        self.assertEqual(client.forwarded_args(["status", "owner", "repo"]), ["status", "owner", "repo"])
+
+    def test_config_path_is_made_absolute(self):
+        expected = ["--config=" + os.path.abspath("config.yml"), "--no-cache", "latest", "owner", "repo"]
+        self.assertEqual(client.forwarded_args(["--config", "config.yml", "--no-cache", "latest", "owner", "repo"]),
+                         expected)
+        self.assertEqual(client.forwarded_args(["--config=config.yml", "--no-cache", "latest", "owner", "repo"]),
+                         expected)
+
+    def test_other_commands_run_locally(self):
+        self.assertIsNone(client.forwarded_args(["accept", "owner", "repo"]))
+        self.assertIsNone(client.forwarded_args(["--help"]))
+        self.assertIsNone(client.forwarded_args(["--replay", "cassette.json", "status", "owner", "repo"]))
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "daemon.sock")
+        os.environ["RELEASE_TOOLS_SOCKET"] = self.path
+        self.commands = []
+
+    def tearDown(self):
+        del os.environ["RELEASE_TOOLS_SOCKET"]
+        shutil.rmtree(self.tmp_dir)
+
+    def start_daemon(self, run):
+        thread = threading.Thread(target=serve, args=(self.path, run))
+        thread.daemon = True
+        thread.start()
+        sock = client.connect(self.path)
+        while sock is None:
+            time.sleep(0.01)
+            sock = client.connect(self.path)
+        sock.close()
+
+    def run_in_daemon(self, args):
+        """Returns the exit code and the output of the command"""
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            exit_code = client.run_in_daemon(args)
+            return exit_code, sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def echo(self, args):
+        self.commands.append(args)
+        print(" ".join(args))
+        return 3
+
+    def test_output_and_exit_code_are_passed_back(self):
+        self.start_daemon(self.echo)
+        self.assertEqual(self.run_in_daemon(["status", "owner", "repo"]), (3, "status owner repo\n"))
+        self.assertEqual(self.run_in_daemon(["latest", "owner", "repo"]), (3, "latest owner repo\n"))
+        self.assertEqual(len(self.commands), 2)
+
+    def test_without_daemon_the_command_runs_locally(self):
+        self.assertIsNone(client.run_in_daemon(["status", "owner", "repo"]))
+
+    def test_socket_left_behind_is_replaced(self):
+        open(self.path, "w").close()
+        self.start_daemon(self.echo)
+        self.assertEqual(self.run_in_daemon(["status"])[0], 3)
+
+    def test_only_one_daemon_listens(self):
+        self.start_daemon(self.echo)
+        self.assertRaises(DaemonException, serve, self.path, self.echo)
+
+    def test_commands_run_in_the_cli(self):
+        kept = dict()
+        self.start_daemon(lambda args: run_command(args, kept))
+        exit_code, output = self.run_in_daemon(["--help"])
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Usage: release-tools", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
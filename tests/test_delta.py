@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import os
+import shutil
+import tempfile
+import unittest
+from release_tools.delta import patch_tree, DeltaException
+from release_tools.github import GithubException
+
+
+class FakeProvider:
+    """Serves a comparison and the contents of the changed files"""
+    def __init__(self, merge_base, files, contents, modes=None):
+        self.merge_base = merge_base
+        self.files = files
+        self.contents = contents
+        self.modes = modes or dict()
+        self.downloaded = []
+
+    def compare(self, base, head):
+        return {"merge_base_commit": {"sha": self.merge_base}, "files": self.files}
+
+    def get_tree(self, ref):
+        return {"tree": [{"path": path, "type": "commit" if self.modes.get(path) == "160000" else "blob",
+                          "mode": self.modes.get(path, "100644")} for path in self.contents]}
+
+    def download_file(self, path, ref, save_to_path):
+        if path not in self.contents:
+            raise GithubException("Not Found")
+        self.downloaded.append(path)
+        with open(save_to_path, "w") as f:
+            f.write(self.contents[path])
+
+
+class TestPatchTree(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.base_tree = os.path.join(self.directory, "base")
+        self.write(self.base_tree, "owner-repo-aaaaaaa/README.md", "readme")
+        self.write(self.base_tree, "owner-repo-aaaaaaa/src/old.py", "old")
+        self.write(self.base_tree, "owner-repo-aaaaaaa/src/main.py", "main")
+        self.target = os.path.join(self.directory, "head")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def write(tree, name, contents):
+        path = os.path.join(tree, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(contents)
+
+    def read(self, name):
+        with open(os.path.join(self.target, "owner-repo-bbbbbbb", name)) as f:
+            return f.read()
+
+    def test_changed_files_are_applied_to_the_base(self):
+        files = [{"filename": "src/main.py", "status": "modified"},
+                 {"filename": "src/old.py", "status": "removed"},
+                 {"filename": "lib/new.py", "status": "added"}]
+        provider = FakeProvider("a" * 40, files, {"src/main.py": "main v2", "lib/new.py": "new"})
+        patch_tree(provider, self.base_tree, "a" * 40, "b" * 40, self.target)
+
+        self.assertEqual(sorted(provider.downloaded), ["lib/new.py", "src/main.py"])
+        self.assertEqual(self.read("README.md"), "readme")
+        self.assertEqual(self.read("src/main.py"), "main v2")
+        self.assertEqual(self.read("lib/new.py"), "new")
+        self.assertFalse(os.path.exists(os.path.join(self.target, "owner-repo-bbbbbbb", "src", "old.py")))
+        # The base tree must not change, even though the trees share files
+        with open(os.path.join(self.base_tree, "owner-repo-aaaaaaa", "src", "main.py")) as f:
+            self.assertEqual(f.read(), "main")
+
+    def test_base_must_be_an_ancestor(self):
+        provider = FakeProvider("c" * 40, [], {})
+        self.assertRaises(DeltaException, patch_tree, provider, self.base_tree,
+                          "a" * 40, "b" * 40, self.target)
+
+    def test_symlinks_and_submodules_are_not_fetched(self):
+        for mode in ["120000", "160000"]:
+            files = [{"filename": "link", "status": "added"}]
+            provider = FakeProvider("a" * 40, files, {"link": "README.md"}, {"link": mode})
+            self.assertRaises(DeltaException, patch_tree, provider, self.base_tree,
+                              "a" * 40, "b" * 40, os.path.join(self.target, mode))
+            self.assertEqual(provider.downloaded, [])
+
+    def test_failed_fetch_is_a_delta_exception(self):
+        files = [{"filename": "src/main.py", "status": "modified"}]
+        provider = FakeProvider("a" * 40, files, {"src/main.py": "main v2"})
+        provider.contents = dict()
+        provider.get_tree = lambda ref: {"tree": [{"path": "src/main.py", "type": "blob", "mode": "100644"}]}
+        self.assertRaises(DeltaException, patch_tree, provider, self.base_tree,
+                          "a" * 40, "b" * 40, self.target)
+
+    def test_executable_mode_comes_from_the_tree(self):
+        files = [{"filename": "run.sh", "status": "added"}]
+        provider = FakeProvider("a" * 40, files, {"run.sh": "#!/bin/sh"}, {"run.sh": "100755"})
+        patch_tree(provider, self.base_tree, "a" * 40, "b" * 40, self.target)
+        mode = os.stat(os.path.join(self.target, "owner-repo-bbbbbbb", "run.sh")).st_mode
+        self.assertTrue(mode & 0o100)
+
+
+if __name__ == "__main__":
+    unittest.main()
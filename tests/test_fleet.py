@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import unittest
+import requests
+from fakes import FakeProvider, pull_request
+from release_tools.fleet import parse_fleet, fleet_status, format_table
+from release_tools.github import GithubException
+from release_tools.transport import Transport
+from release_tools.workflow import Workflow, Conventions
+
+
+class FleetProvider(FakeProvider):
+    """One repository of the fleet. Without a tag or branches, reading them fails"""
+    def __init__(self, owner, repo, tag_name, branch_names):
+        FakeProvider.__init__(self, branch_names or [], tag_name,
+                              [pull_request(1, name) for name in branch_names or []])
+        self.owner = owner
+        self.repo = repo
+        self.fail_branches = branch_names is None
+
+    def get_latest_version_tag_name(self):
+        if self.tag_name is None:
+            raise GithubException("Not Found")
+        return FakeProvider.get_latest_version_tag_name(self)
+
+    def get_branches(self):
+        if self.fail_branches:
+            raise requests.exceptions.ConnectionError("Connection refused")
+        return FakeProvider.get_branches(self)
+
+
+class SilentProvider(FleetProvider):
+    """Fails with an exception that has no message"""
+    def get_latest_version_tag_name(self):
+        raise GithubException()
+
+
+class TestFleet(unittest.TestCase):
+    def test_can_parse_both_forms(self):
+        config = {"fleet": ["withrocks/release-tools", {"owner": "owner", "repo": "repo"}]}
+        self.assertEqual(parse_fleet(config), [("withrocks", "release-tools"), ("owner", "repo")])
+
+    def test_status_of_each_repo_in_one_table(self):
+        workflows = [
+            Workflow(FleetProvider("owner", "one", "v1.2.0", ["develop", "release-1.3.0"]), Conventions, False),
+            Workflow(FleetProvider("owner", "two", None, ["develop"]), Conventions, False),
+        ]
+        lines = format_table(fleet_status(workflows, Transport(), workers=2))
+        self.assertEqual(lines, ["Repository  Latest  Queue",
+                                 "owner/one   1.2.0   release-1.3.0 (PRs=1)",
+                                 "owner/two   -       error: Not Found"])
+
+    def test_one_failing_repo_does_not_hide_the_others(self):
+        workflows = [
+            Workflow(FleetProvider("owner", "one", "v1.2.0", None), Conventions, False),
+            Workflow(FleetProvider("owner", "two", "latest", ["develop"]), Conventions, False),
+            Workflow(FleetProvider("owner", "three", "v1.2.0", ["develop"]), Conventions, False),
+        ]
+        statuses = fleet_status(workflows, Transport(), workers=2)
+        self.assertEqual(statuses[0].error, "Connection refused")
+        self.assertIn("latest", statuses[1].error)
+        self.assertIsNone(statuses[2].error)
+
+    def test_error_without_a_message_is_named(self):
+        workflows = [Workflow(SilentProvider("owner", "one", "v1.2.0", ["develop"]), Conventions, False)]
+        lines = format_table(fleet_status(workflows, Transport()))
+        self.assertEqual(lines[1], "owner/one   -       error: GithubException")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,36 @@
 #!/usr/bin/env python
+import os
+import tempfile
 import unittest
+from release_tools.cache import ResponseCache
+from release_tools.cassette import RecordingTransport, ReplayTransport
 from release_tools.github import GithubProvider
 
+CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes", "github_integration.jsonl")
 
-# Tests for the github provider, need access to github
-# TODO: add caching to the requests for the test
+
+# Tests for the github provider. They replay the responses in the cassette, unless
+# RELEASE_TOOLS_LIVE_TESTS is set: then they need access to github, and record the
+# cassette again. The responses are cached between live runs so that they don't use
+# up the rate limit.
 class TestGithubProvider(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if os.environ.get("RELEASE_TOOLS_LIVE_TESTS"):
+            cache_dir = os.path.join(tempfile.gettempdir(), "release-tools-test-cache")
+            cls.transport = RecordingTransport(CASSETTE, cache=ResponseCache(cache_dir, ttl=3600))
+        else:
+            cls.transport = ReplayTransport(CASSETTE)
+
     def test_can_get_tag_name(self):
-        provider = GithubProvider("withrocks", "release-tools")
-        tag_name = provider.get_latest_version_tag_name() 
+        provider = GithubProvider("withrocks", "release-tools", transport=self.transport)
+        tag_name = provider.get_latest_version_tag_name()
         self.assertTrue(tag_name.startswith("v"))
 
     def test_can_get_pull_requests(self):
-        provider = GithubProvider("withrocks", "release-tools")
-        requests = provider.get_pull_requests("master")
+        provider = GithubProvider("withrocks", "release-tools", transport=self.transport)
+        requests = list(provider.get_pull_requests("master"))
         self.assertTrue(len(requests) == 0)
 
 if __name__ == "__main__":
     unittest.main()
-
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# Unit tests for the github provider that don't need access to github
+
+import os
+import shutil
+import tempfile
+import unittest
+from fakes import FakeResponse
+from release_tools.github import GithubProvider
+
+
+class FakeTransport:
+    """Serves fixed responses by url and records the requested urls"""
+    def __init__(self, responses):
+        self.responses = responses
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return self.responses[url]
+
+
+class TestPagination(unittest.TestCase):
+    def setUp(self):
+        base = "https://api.github.com/repos/owner/repo/branches"
+        self.transport = FakeTransport({
+            base: FakeResponse(200, [{"name": "develop"}, {"name": "master"}], next_url=base + "?page=2"),
+            base + "?page=2": FakeResponse(200, [{"name": "release-1.3.0"}]),
+        })
+        self.provider = GithubProvider("owner", "repo", transport=self.transport)
+
+    def test_follows_next_links(self):
+        names = [branch["name"] for branch in self.provider.get_branches()]
+        self.assertEqual(names, ["develop", "master", "release-1.3.0"])
+        self.assertEqual(len(self.transport.requested), 2)
+
+    def test_next_page_is_fetched_on_demand(self):
+        branches = self.provider.get_branches()
+        next(branches)
+        next(branches)
+        self.assertEqual(len(self.transport.requested), 1)
+
+
+class TestDownloadFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_path_is_quoted(self):
+        url = "https://api.github.com/repos/owner/repo/contents/docs/C%23%20notes%3F%25.md"
+        transport = FakeTransport({url: FakeResponse(200, content="notes")})
+        provider = GithubProvider("owner", "repo", transport=transport)
+        provider.download_file(u"docs/C# notes?%.md", "sha", os.path.join(self.directory, "notes.md"))
+        self.assertEqual(transport.requested, [url])
+
+
+def release(name, published_at, body):
+    return {"name": name, "published_at": published_at, "body": body}
+
+
+class TestReleaseHistory(unittest.TestCase):
+    def setUp(self):
+        base = "https://api.github.com/repos/owner/repo/releases"
+        self.transport = FakeTransport({
+            base: FakeResponse(200, [release("v1.2.0", "2017-03-02T10:00:00Z", "Fixes\r\nMore fixes"),
+                                     release("v1.1.0", "2017-02-01T10:00:00Z", "Features")],
+                               next_url=base + "?page=2"),
+            base + "?page=2": FakeResponse(200, [release("v1.0.0", "2017-01-01T10:00:00Z", "First")]),
+        })
+        self.provider = GithubProvider("owner", "repo", transport=self.transport)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "history.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_all_releases_are_written(self):
+        self.provider.download_release_history(self.path)
+        self.assertEqual(self.read(), "v1.2.0, 2017-03-02\n\nFixes\nMore fixes\n\n\n"
+                                      "v1.1.0, 2017-02-01\n\nFeatures\n\n\n"
+                                      "v1.0.0, 2017-01-01\n\nFirst")
+        self.assertEqual(os.listdir(self.directory), ["history.txt"])
+
+    def test_incremental_only_fetches_newer_releases(self):
+        with open(self.path, "w") as f:
+            f.write("v1.1.0, 2017-02-01\n\nFeatures\n\n\nv1.0.0, 2017-01-01\n\nFirst")
+        self.provider.download_release_history(self.path, incremental=True)
+        self.assertEqual(self.read(), "v1.2.0, 2017-03-02\n\nFixes\nMore fixes\n\n\n"
+                                      "v1.1.0, 2017-02-01\n\nFeatures\n\n\n"
+                                      "v1.0.0, 2017-01-01\n\nFirst")
+        self.assertEqual(len(self.transport.requested), 1)
+
+    def test_incremental_without_new_releases_leaves_file(self):
+        with open(self.path, "w") as f:
+            f.write("v1.2.0, 2017-03-02\n\nFixes")
+        self.provider.download_release_history(self.path, incremental=True)
+        self.assertEqual(self.read(), "v1.2.0, 2017-03-02\n\nFixes")
+        self.assertEqual(os.listdir(self.directory), ["history.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Tests for the GraphQL provider, against a fake GraphQL endpoint on localhost
+
+import json
+import threading
+import unittest
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from release_tools.graphql import GraphQLGithubProvider
+from release_tools.workflow import Workflow, Conventions
+
+
+def page(nodes, cursor, has_next):
+    return {"pageInfo": {"hasNextPage": has_next, "endCursor": cursor}, "nodes": nodes}
+
+
+class FakeGraphQLHandler(BaseHTTPRequestHandler):
+    """Serves the refs in two pages and the pull requests in one"""
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.queries.append(body["variables"])
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+        variables = body["variables"]
+        repository = {"latestRelease": {"tagName": "v1.2.0"}}
+        if variables["withRefs"]:
+            if variables["refsCursor"] is None:
+                repository["refs"] = page([{"name": "develop", "target": {"oid": "a" * 40}},
+                                           {"name": "release-1.3.0", "target": {"oid": "b" * 40}}],
+                                          "cursor1", True)
+            else:
+                repository["refs"] = page([{"name": "hotfix-1.2.1", "target": {"oid": "c" * 40}}],
+                                          "cursor2", False)
+        if variables["withPulls"]:
+            repository["pullRequests"] = page([{"baseRefName": "release-1.3.0"},
+                                               {"baseRefName": "release-1.3.0"}], "cursor3", False)
+        content = json.dumps({"data": {"repository": repository}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGraphQLProvider(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FakeGraphQLHandler)
+        self.server.queries = []
+        self.server.status = 200
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = "http://127.0.0.1:{}/graphql".format(self.server.server_address[1])
+        self.provider = GraphQLGithubProvider("owner", "repo", "token", graphql_url=url)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_state_is_read_with_paging_only_where_needed(self):
+        state = self.provider.get_repo_state()
+        self.assertEqual(state["latest_tag_name"], "v1.2.0")
+        self.assertEqual([branch["name"] for branch in state["branches"]],
+                         ["develop", "release-1.3.0", "hotfix-1.2.1"])
+        self.assertEqual(state["pull_request_counts"], {"release-1.3.0": 2})
+        self.assertEqual(len(self.server.queries), 2)
+        self.assertFalse(self.server.queries[1]["withPulls"])
+
+    def test_workflow_reads_queue_from_state(self):
+        workflow = Workflow(self.provider, Conventions, False)
+        workflow.prefetch()
+        self.assertEqual(workflow.get_queue(), ["hotfix-1.2.1", "release-1.3.0"])
+        self.assertEqual(workflow.get_pull_request_count("release-1.3.0"), 2)
+        self.assertEqual(workflow.get_pull_request_count("hotfix-1.2.1"), 0)
+
+    def test_returns_none_when_graphql_is_not_available(self):
+        self.server.status = 404
+        self.assertIsNone(self.provider.get_repo_state())
+        self.assertIsNone(self.provider.get_repo_state())
+        self.assertEqual(len(self.server.queries), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
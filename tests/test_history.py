@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import datetime
+import json
+import unittest
+import dateutil.parser
+from release_tools.history import parse_timestamp, normalize_newlines, parse_releases, render, \
+    TextRenderer, MarkdownRenderer, JsonLinesRenderer, RENDERERS
+
+
+def release(name, published_at, body):
+    return {"name": name, "published_at": published_at, "body": body}
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.releases = [release(u"v1.2.0 \u00e5", "2017-03-02T23:59:59Z", u"Fixes\r\nMore\r\n"),
+                         release(u"v1.1.0", "2017-02-01T00:00:00Z", u"Features")]
+
+    def test_github_timestamps_are_parsed_like_dateutil(self):
+        for value in ["2017-03-02T23:59:59Z", "2000-02-29T00:00:00Z"]:
+            self.assertEqual(parse_timestamp(value), dateutil.parser.parse(value).replace(tzinfo=None))
+
+    def test_other_timestamps_fall_back_to_dateutil(self):
+        self.assertEqual(parse_timestamp("2017-03-02T10:00:00+02:00").utcoffset(),
+                         datetime.timedelta(hours=2))
+        self.assertEqual(parse_timestamp("2017-03-02").date(), datetime.date(2017, 3, 2))
+
+    def test_newlines_are_normalized_like_joining_the_lines(self):
+        for body in ["a\r\nb", "a\rb\n", "a\n\n", "", "\r\n", "a\r\n\r\nb\r"]:
+            self.assertEqual(normalize_newlines(body), "\n".join(body.splitlines()))
+
+    def test_text_format(self):
+        text = "".join(render(parse_releases(self.releases), TextRenderer))
+        self.assertEqual(text, "v1.2.0 \xc3\xa5, 2017-03-02\n\nFixes\nMore\n\n\nv1.1.0, 2017-02-01\n\nFeatures")
+
+    def test_json_lines_format(self):
+        lines = "".join(render(parse_releases(self.releases), JsonLinesRenderer)).splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines], [u"v1.2.0 \u00e5", u"v1.1.0"])
+        self.assertEqual(json.loads(lines[0])["body"], u"Fixes\nMore")
+
+    def test_headings_are_read_back(self):
+        for renderer in RENDERERS.values():
+            first_line = renderer.render(next(parse_releases(self.releases))).split("\n")[0]
+            self.assertEqual(renderer.read_heading(first_line),
+                             ("v1.2.0 \xc3\xa5", datetime.date(2017, 3, 2)))
+
+    def test_releases_stop_at_the_newest_known(self):
+        names = [r.name for r in parse_releases(self.releases, ("v1.1.0", datetime.date(2017, 1, 1)))]
+        self.assertEqual(names, ["v1.2.0 \xc3\xa5"])
+        names = [r.name for r in parse_releases(self.releases, ("gone", datetime.date(2017, 2, 15)))]
+        self.assertEqual(names, ["v1.2.0 \xc3\xa5"])
+
+    def test_markdown_format(self):
+        text = "".join(render(parse_releases(self.releases[1:]), MarkdownRenderer))
+        self.assertEqual(text, "## v1.1.0 (2017-02-01)\n\nFeatures")
+
+
+if __name__ == "__main__":
+    unittest.main()
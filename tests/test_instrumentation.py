@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from fakes import FakeResponse
+from release_tools.cache import ResponseCache
+from release_tools.github import GithubProvider
+from release_tools.instrumentation import ApiCall, Profiler, percentile
+from release_tools.transport import Transport
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Tests that api calls are reported to the hooks and summarized by the profiler
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.transport = Transport(cache=ResponseCache(self.directory, ttl=60))
+        self.profiler = Profiler()
+        self.transport.hooks.append(self.profiler.record)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fake_session(self, *responses):
+        responses = list(responses)
+        self.transport.session.request = lambda method, url, **kwargs: responses.pop(0)
+
+    def test_calls_are_recorded_with_endpoint_template(self):
+        self.fake_session(FakeResponse(200, [{"name": "develop"}], {"ETag": '"abc"'}))
+        provider = GithubProvider("owner", "repo", "token", self.transport)
+        list(provider.get_branches())
+        list(provider.get_branches())
+        self.assertEqual([(call.endpoint, call.method, call.status_code, call.cache)
+                          for call in self.profiler.calls],
+                         [("/repos/{owner}/{repo}/branches", "GET", 200, "miss"),
+                          ("/repos/{owner}/{repo}/branches", "GET", 200, "hit")])
+        self.assertEqual(self.profiler.calls[0].size, len('[{"name": "develop"}]'))
+
+    def test_endpoint_defaults_to_path(self):
+        self.fake_session(FakeResponse(201))
+        self.transport.post("https://api.github.com/repos/owner/repo/merges?access_token=x")
+        self.assertEqual(self.profiler.calls[0].endpoint, "/repos/owner/repo/merges")
+        self.assertIsNone(self.profiler.calls[0].cache)
+
+    def test_overlapping_calls_count_once_as_io(self):
+        self.profiler.calls = [ApiCall("/a", "GET", 200, 0, 100.0, 2.0),
+                               ApiCall("/b", "GET", 200, 0, 101.0, 2.0),
+                               ApiCall("/c", "GET", 200, 0, 110.0, 1.0)]
+        self.assertAlmostEqual(self.profiler.io_time(), 4.0)
+        summary = self.profiler.report(elapsed=20.0)[-1]
+        self.assertIn("3 api calls", summary)
+        self.assertIn("4.000s waiting for I/O, 16.000s in workflow logic", summary)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(range(1, 101), 95), 95)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_calls_are_exported_as_json_lines(self):
+        self.profiler.calls = [ApiCall("/a", "GET", 200, 10, 100.0, 0.5, "miss")]
+        path = os.path.join(self.directory, "profile.jsonl")
+        self.profiler.write_jsonl(path, "status")
+        self.profiler.write_jsonl(path, "latest")
+        with open(path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["command"] for entry in entries], ["status", "latest"])
+        self.assertEqual(entries[0]["endpoint"], "/a")
+        self.assertEqual(entries[0]["bytes"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
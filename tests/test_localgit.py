@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+# Tests for the local git provider, against a repository on disk
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from release_tools.localgit import LocalGitProvider, LocalGitException
+from release_tools.refs import RefResolver, StaleRefException
+from release_tools.watch import Watcher
+from release_tools.workflow import Workflow, Conventions
+
+
+class FakeRemote:
+    owner = "owner"
+    repo = "repo"
+    access_token = None
+
+    def __init__(self):
+        self.created = []
+        self.refs = dict()
+
+    def create_branch_from_master(self, new_branch):
+        self.created.append(new_branch)
+
+    def get_pull_requests(self, base_branch):
+        return []
+
+    def get_ref(self, ref):
+        return self.refs.get(ref)
+
+
+class TestLocalGitProvider(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.origin = os.path.join(self.directory, "origin")
+        self.git("init", "--quiet", self.origin)
+        with open(os.path.join(self.origin, "README.md"), "w") as f:
+            f.write("readme")
+        self.git("-C", self.origin, "add", "README.md")
+        self.git("-C", self.origin, "-c", "user.name=test", "-c", "user.email=test@example.com",
+                 "commit", "--quiet", "-m", "Initial")
+        self.git("-C", self.origin, "branch", "-M", "master")
+        for branch in ["develop", "release-1.3.0", "feature-x"]:
+            self.git("-C", self.origin, "branch", branch)
+        for tag in ["v1.1.0", "v1.2.0", "v1.10.0-rc"]:
+            self.git("-C", self.origin, "tag", tag)
+        self.remote = FakeRemote()
+        self.provider = LocalGitProvider(self.remote, os.path.join(self.directory, "mirror.git"),
+                                         url=self.origin)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def git(*args):
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call(("git",) + args, stdout=devnull, stderr=devnull)
+
+    def test_reads_branches_and_tags_from_mirror(self):
+        names = [branch["name"] for branch in self.provider.get_branches()]
+        self.assertEqual(names, ["develop", "feature-x", "master", "release-1.3.0"])
+        self.assertEqual(self.provider.get_latest_version_tag_name(), "v1.2.0")
+
+    def test_archive_is_laid_out_like_github(self):
+        path = os.path.join(self.directory, "build")
+        self.provider.download_archive("release-1.3.0", path)
+        sha = self.provider.get_commit_sha("release-1.3.0")
+        with open(os.path.join(path, "owner-repo-" + sha[:7], "README.md")) as f:
+            self.assertEqual(f.read(), "readme")
+
+    def test_writes_go_to_remote_and_make_mirror_stale(self):
+        self.provider.get_branches()
+        self.provider.create_branch_from_master("hotfix-1.2.1")
+        self.assertEqual(self.remote.created, ["hotfix-1.2.1"])
+        self.git("-C", self.origin, "branch", "hotfix-1.2.1")
+        self.assertIn("hotfix-1.2.1", [branch["name"] for branch in self.provider.get_branches()])
+
+    def test_refs_are_resolved_from_mirror(self):
+        self.provider.refs.load_all()
+        sha = self.provider.get_commit_sha("master")
+        self.assertEqual(self.provider.refs.resolve("release-1.3.0"), sha)
+        self.assertEqual(self.provider.refs.resolve("v1.2.0"), sha)
+        self.assertEqual(self.provider.get_ref("refs/heads/nothing"), None)
+        self.assertEqual([ref["ref"] for ref in self.provider.get_refs("heads/rel")],
+                         ["refs/heads/release-1.3.0"])
+
+    def test_refs_are_verified_against_the_remote(self):
+        resolver = RefResolver(self.provider)
+        sha = resolver.resolve("release-1.3.0")
+        self.remote.refs["refs/heads/release-1.3.0"] = sha
+        self.assertEqual(resolver.verify("release-1.3.0"), sha)
+        self.remote.refs["refs/heads/release-1.3.0"] = "f" * 40
+        self.assertRaises(StaleRefException, resolver.verify, "release-1.3.0")
+
+    def test_token_is_passed_in_the_environment(self):
+        self.remote.access_token = "secret"
+        self.assertEqual(self.provider.get_latest_version_tag_name(), "v1.2.0")
+        env = self.provider._auth_env()
+        index = int(env["GIT_CONFIG_COUNT"]) - 1
+        self.assertEqual(env["GIT_CONFIG_KEY_{}".format(index)], "http.extraheader")
+        self.assertTrue(env["GIT_CONFIG_VALUE_{}".format(index)].startswith("Authorization: basic "))
+        self.assertEqual(env["GIT_TERMINAL_PROMPT"], "0")
+
+    def test_failed_clone_is_a_local_git_exception(self):
+        provider = LocalGitProvider(self.remote, os.path.join(self.directory, "other.git"),
+                                    url=os.path.join(self.directory, "nothing"))
+        self.assertRaises(LocalGitException, list, provider.get_branches())
+
+    def test_workflow_queue_from_mirror(self):
+        workflow = Workflow(self.provider, Conventions, False)
+        self.assertEqual(workflow.get_queue(), ["release-1.3.0"])
+
+    def test_watch_fetches_on_each_poll(self):
+        watcher = Watcher(Workflow(self.provider, Conventions, False), lambda branch, sha: None)
+        self.assertEqual(watcher.poll()[0], "release-1.3.0")
+        self.git("-C", self.origin, "branch", "hotfix-1.2.1")
+        self.assertEqual(watcher.poll()[0], "hotfix-1.2.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
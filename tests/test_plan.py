@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from fakes import FakeProvider
+from release_tools.concurrency import Executor
+from release_tools.github import GithubException, MergeException
+from release_tools.plan import Plan, Journal, execute
+from release_tools.workflow import Workflow, Conventions, WorkflowException
+
+
+class WritableProvider(FakeProvider):
+    """A repository with a hotfix and a release in the queue, recording the writes"""
+    def __init__(self):
+        FakeProvider.__init__(self, ["master", "develop", "hotfix-1.2.1", "release-1.3.0"])
+        self.writes = []
+        self.fail_merge = False
+        self.fail_tag = False
+
+    def create_branch_from_master(self, new_branch):
+        self.writes.append(("branch", new_branch))
+
+    def merge(self, base, head, commit_message):
+        if self.fail_merge:
+            raise MergeException("Merge conflict")
+        self.writes.append(("merge", base, head))
+
+    def tag_release(self, tag_name, branch):
+        if self.fail_tag:
+            raise GithubException("Server error")
+        self.writes.append(("tag", tag_name))
+
+    def create_pull_request(self, base, head, title, body):
+        self.writes.append(("pull_request", base))
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = Journal(os.path.join(self.directory, "journals", "owner", "repo.json"))
+        self.executor = Executor(4)
+        self.provider = WritableProvider()
+
+    def tearDown(self):
+        self.executor.close()
+        shutil.rmtree(self.directory)
+
+    def workflow(self, whatif=False):
+        return Workflow(self.provider, Conventions, whatif, executor=self.executor, journal=self.journal)
+
+    def test_independent_steps_run_concurrently(self):
+        first, second = threading.Event(), threading.Event()
+
+        def step(own, other):
+            own.set()
+            if not other.wait(5):
+                raise AssertionError("Steps didn't run concurrently")
+        plan = Plan("test", {})
+        plan.add("a", "Step a", lambda: step(first, second))
+        plan.add("b", "Step b", lambda: step(second, first))
+        execute(plan, self.executor, self.journal)
+        self.assertIsNone(self.journal.pending())
+
+    def test_hotfix_accept_sends_both_pull_requests_after_tagging(self):
+        self.workflow().accept_release_candidate(force=True)
+        self.assertEqual(self.provider.writes[:2], [("merge", "master", "hotfix-1.2.1"), ("tag", "v1.2.1")])
+        self.assertEqual(sorted(self.provider.writes[2:]),
+                         [("pull_request", "develop"), ("pull_request", "release-1.3.0")])
+
+    def test_failed_accept_resumes_without_merging_again(self):
+        self.provider.fail_tag = True
+        self.assertRaises(GithubException, self.workflow().accept_release_candidate, True)
+        self.assertEqual(self.journal.pending()["done"], ["merge"])
+        self.provider.fail_tag = False
+        self.workflow().accept_release_candidate(force=True)
+        self.assertEqual([write[0] for write in self.provider.writes],
+                         ["merge", "tag", "pull_request", "pull_request"])
+        self.assertIsNone(self.journal.pending())
+
+    def test_failed_first_step_leaves_nothing_to_resume(self):
+        self.provider.fail_merge = True
+        self.assertRaises(SystemExit, self.workflow().accept_release_candidate, True)
+        self.assertIsNone(self.journal.pending())
+        self.workflow().create_hotfix()
+        self.assertEqual(self.provider.writes, [("branch", "hotfix-1.2.1")])
+
+    def test_resumed_accept_checks_that_the_branch_has_not_moved(self):
+        self.provider.fail_tag = True
+        self.assertRaises(GithubException, self.workflow().accept_release_candidate, True)
+        self.provider.fail_tag = False
+        self.provider.move("hotfix-1.2.1", "sha-new")
+        self.assertRaises(SystemExit, self.workflow().accept_release_candidate, True)
+        self.assertEqual(self.provider.writes, [("merge", "master", "hotfix-1.2.1")])
+        self.assertEqual(self.journal.pending()["done"], ["merge"])
+
+    def test_other_command_stopped_halfway_is_reported(self):
+        self.provider.fail_tag = True
+        self.assertRaises(GithubException, self.workflow().accept_release_candidate, True)
+        self.assertRaises(WorkflowException, self.workflow().create_hotfix)
+
+    def test_whatif_only_prints_the_plan(self):
+        self.workflow(whatif=True).accept_release_candidate(force=True)
+        self.assertEqual(self.provider.writes, [])
+        self.assertIsNone(self.journal.pending())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Tests for the rate limit scheduling, against a fake api on localhost that imposes limits
+
+import threading
+import time
+import unittest
+from fakes import FakeResponse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from release_tools.ratelimit import RateLimiter, LOW, NORMAL
+from release_tools.transport import Transport
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """
+    Allows server.limit calls until server.reset, and answers the first
+    server.secondary_limited calls with a Retry-After
+    """
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        with server.lock:
+            server.calls.append(time.time())
+            if server.secondary_limited:
+                server.secondary_limited -= 1
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+            else:
+                if time.time() >= server.reset:
+                    server.reset = int(time.time()) + 2
+                    server.remaining = server.limit
+                if server.remaining > 0:
+                    server.remaining -= 1
+                    self.send_response(200)
+                else:
+                    server.rejected += 1
+                    self.send_response(403)
+                self.send_header("X-RateLimit-Limit", str(server.limit))
+                self.send_header("X-RateLimit-Remaining", str(server.remaining))
+                self.send_header("X-RateLimit-Reset", str(server.reset))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRateLimitedServer(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = []
+        self.server.limit = 2
+        self.server.remaining = 2
+        self.server.reset = int(time.time()) + 2
+        self.server.rejected = 0
+        self.server.secondary_limited = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{}/repos/owner/repo/branches".format(self.server.server_address[1])
+        self.transport = Transport(backoff_factor=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_calls_wait_for_the_reset_instead_of_failing(self):
+        reset = self.server.reset
+        statuses = [self.transport.get(self.url).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 200])
+        self.assertEqual(self.server.rejected, 0)
+        self.assertGreaterEqual(self.server.calls[2], reset)
+
+    def test_secondary_limit_is_waited_out_even_for_posts(self):
+        self.server.secondary_limited = 1
+        response = self.transport.post(self.url, json={})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertGreaterEqual(self.server.calls[1] - self.server.calls[0], 1)
+        # Halved, and growing back slowly
+        self.assertLess(self.transport.limiter.concurrency, 6)
+
+    def test_concurrent_calls_stay_within_the_limit(self):
+        self.server.limit = self.server.remaining = 3
+        self.transport.get(self.url)
+        threads = [threading.Thread(target=self.transport.get, args=(self.url,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.calls), 5)
+        self.assertEqual(self.server.rejected, 0)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(max_concurrency=4, reserve=10)
+        self.limiter.update(FakeResponse(200, headers={"X-RateLimit-Limit": "5000",
+                                                       "X-RateLimit-Remaining": "5",
+                                                       "X-RateLimit-Reset": str(int(time.time()) + 600)}))
+
+    def test_low_priority_calls_leave_the_reserve(self):
+        self.assertGreater(self.limiter._wait_time(LOW), 500)
+        self.assertEqual(self.limiter._wait_time(NORMAL), 0)
+
+    def test_reserve_is_at_most_a_tenth_of_the_limit(self):
+        self.limiter.update(FakeResponse(200, headers={"X-RateLimit-Limit": "60",
+                                                       "X-RateLimit-Remaining": "7",
+                                                       "X-RateLimit-Reset": str(int(time.time()) + 900)}))
+        self.assertEqual(self.limiter._wait_time(LOW), 0)
+
+    def test_no_more_calls_in_flight_than_calls_left(self):
+        self.limiter.remaining = 2
+        self.limiter.acquire()
+        self.limiter.acquire()
+        self.assertIsNone(self.limiter._wait_time(NORMAL))
+        self.limiter.release()
+        self.assertEqual(self.limiter._wait_time(NORMAL), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
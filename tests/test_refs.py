@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import unittest
+from fakes import FakeResponse
+from release_tools.github import GithubProvider
+from release_tools.refs import RefResolver, RefException, StaleRefException
+
+
+class FakeProvider:
+    """Has the refs in a dict and counts the lookups"""
+    def __init__(self, refs):
+        self.refs = refs
+        self.lookups = []
+
+    def get_ref(self, ref):
+        self.lookups.append(ref)
+        return self.refs.get(ref)
+
+    def get_refs(self, prefix):
+        return [{"ref": ref, "object": {"sha": sha}} for ref, sha in sorted(self.refs.items())]
+
+
+class FakeTransport:
+    def __init__(self):
+        self.requested = []
+        self.posted = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return FakeResponse(200, {"ref": "refs/heads/master", "object": {"type": "commit", "sha": "a" * 40}})
+
+    def post(self, url, json=None, **kwargs):
+        self.posted.append(json)
+        return FakeResponse(201, {})
+
+
+class TestRefResolver(unittest.TestCase):
+    def setUp(self):
+        self.provider = FakeProvider({"refs/heads/master": "a" * 40, "refs/tags/v1.2.0": "b" * 40})
+        self.refs = RefResolver(self.provider)
+
+    def test_lookups_are_served_from_the_dict(self):
+        self.assertEqual(self.refs.resolve("master"), "a" * 40)
+        self.assertEqual(self.refs.resolve("refs/heads/master"), "a" * 40)
+        self.assertEqual(self.provider.lookups, ["refs/heads/master"])
+
+    def test_tags_and_shas_are_resolved(self):
+        self.assertEqual(self.refs.resolve("v1.2.0"), "b" * 40)
+        self.assertEqual(self.refs.resolve("c" * 40), "c" * 40)
+
+    def test_after_loading_all_refs_missing_refs_are_not_looked_up(self):
+        self.refs.load_all()
+        self.assertEqual(self.refs.resolve("v1.2.0"), "b" * 40)
+        self.assertRaises(RefException, self.refs.resolve, "develop")
+        self.assertEqual(self.provider.lookups, [])
+
+    def test_moved_ref_is_stale(self):
+        self.refs.load_branches([{"name": "master", "commit": {"sha": "a" * 40}}])
+        self.assertEqual(self.refs.verify("master"), "a" * 40)
+        self.provider.refs["refs/heads/master"] = "d" * 40
+        self.assertRaises(StaleRefException, self.refs.verify, "master")
+        self.assertEqual(self.refs.resolve("master"), "d" * 40)
+
+    def test_branch_is_created_from_single_ref_lookup(self):
+        transport = FakeTransport()
+        provider = GithubProvider("owner", "repo", transport=transport)
+        provider.create_branch_from_master("release-1.3.0")
+        provider.create_branch_from_master("hotfix-1.2.1")
+        self.assertEqual(transport.requested, ["https://api.github.com/repos/owner/repo/git/ref/heads/master"])
+        self.assertEqual(transport.posted[1], {"ref": "refs/heads/hotfix-1.2.1", "sha": "a" * 40})
+
+
+if __name__ == "__main__":
+    unittest.main()
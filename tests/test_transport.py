@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import unittest
+from fakes import FakeResponse
+from release_tools.transport import Transport
+
+
+class TestTransport(unittest.TestCase):
+    """
+    Tests the retry policy of the shared transport
+    """
+    def setUp(self):
+        self.transport = Transport(max_retries=2, backoff_factor=0)
+        self.calls = []
+
+    def fake_session(self, *status_codes):
+        responses = list(status_codes)
+
+        def request(method, url, **kwargs):
+            self.calls.append(method)
+            return FakeResponse(responses.pop(0))
+        self.transport.session.request = request
+
+    def test_get_is_retried_on_server_error(self):
+        self.fake_session(502, 200)
+        response = self.transport.get("http://localhost")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_get_gives_up_after_max_retries(self):
+        self.fake_session(503, 503, 503)
+        response = self.transport.get("http://localhost")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_post_is_not_retried(self):
+        self.fake_session(502, 200)
+        response = self.transport.post("http://localhost")
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_post_marked_idempotent_is_retried(self):
+        self.fake_session(502, 201)
+        response = self.transport.post("http://localhost", idempotent=True)
+        self.assertEqual(response.status_code, 201)
+
+
+if __name__ == "__main__":
+    unittest.main()
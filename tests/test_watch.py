@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import subprocess
+import unittest
+from fakes import FakeProvider
+from release_tools.archive import ArchiveException
+from release_tools.github import GithubException
+from release_tools.watch import Watcher
+from release_tools.workflow import Workflow, Conventions
+
+
+class FailingProvider(FakeProvider):
+    """Fails to read the branches while error is set"""
+    def __init__(self):
+        FakeProvider.__init__(self)
+        self.error = None
+
+    def get_branches(self):
+        if self.error is not None:
+            raise self.error
+        return FakeProvider.get_branches(self)
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.provider = FailingProvider()
+        self.changes = []
+        self.result = None
+        self.error = None
+        self.sleeps = []
+        self.watcher = Watcher(Workflow(self.provider, Conventions, False), self.on_change,
+                               min_interval=10, max_interval=60, sleep=self.sleeps.append)
+
+    def on_change(self, branch, sha):
+        self.changes.append((branch, sha))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def test_interval_backs_off_while_nothing_changes(self):
+        self.watcher.run(polls=5)
+        self.assertEqual(self.changes, [("release-1.3.0", "sha-release-1.3.0")])
+        self.assertEqual(self.sleeps, [10, 20, 40, 60])
+
+    def test_new_commit_on_the_head_is_handled(self):
+        self.watcher.run(polls=3)
+        self.provider.move("release-1.3.0", "d")
+        self.watcher.run(polls=1)
+        self.assertEqual(self.changes, [("release-1.3.0", "sha-release-1.3.0"), ("release-1.3.0", "d")])
+        self.assertEqual(self.watcher.interval, 10)
+
+    def test_new_head_is_handled(self):
+        self.watcher.check()
+        self.provider.move("hotfix-1.2.1", "e")
+        self.assertTrue(self.watcher.check())
+        self.assertEqual(self.changes[-1], ("hotfix-1.2.1", "e"))
+
+    def test_failed_handler_is_called_again(self):
+        self.result = False
+        self.watcher.check()
+        self.result = None
+        self.watcher.check()
+        self.watcher.check()
+        self.assertEqual(self.changes, [("release-1.3.0", "sha-release-1.3.0")] * 2)
+
+    def test_failed_poll_backs_off(self):
+        self.provider.error = GithubException("Service unavailable")
+        self.watcher.run(polls=2)
+        self.assertEqual(self.changes, [])
+        self.assertEqual(self.sleeps, [20])
+
+    def test_failed_fetch_into_the_mirror_keeps_watching(self):
+        self.provider.error = subprocess.CalledProcessError(128, ["git", "fetch"])
+        self.assertFalse(self.watcher.check())
+        self.provider.error = None
+        self.assertTrue(self.watcher.check())
+        self.assertEqual(self.changes, [("release-1.3.0", "sha-release-1.3.0")])
+
+    def test_handler_failing_to_extract_is_called_again(self):
+        self.error = ArchiveException("Truncated archive")
+        self.watcher.check()
+        self.error = None
+        self.watcher.check()
+        self.watcher.check()
+        self.assertEqual(self.changes, [("release-1.3.0", "sha-release-1.3.0")] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Tests for the webhook server, posting deliveries like Github's to it on localhost
+
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+import requests
+from fakes import FakeProvider, pull_request
+from release_tools.webhooks import RepoState, WebhookServer, WebhookStateProvider
+from release_tools.workflow import Workflow, Conventions
+
+
+REPOSITORY = {"full_name": "owner/repo"}
+
+
+class TestWebhookServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.provider = FakeProvider(pull_requests=[pull_request(1, "release-1.3.0"),
+                                                    pull_request(2, "develop")])
+        self.state = RepoState(os.path.join(self.tmp_dir, "owner", "repo.json"))
+        self.state.seed(self.provider)
+        self.provider.calls = []
+        self.start_server(None)
+
+    def start_server(self, secret):
+        self.server = WebhookServer(("127.0.0.1", 0), {"owner/repo": (self.state, self.provider)}, secret)
+        self.url = "http://127.0.0.1:{}/".format(self.server.server_port)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def post(self, event, payload, headers=None):
+        payload = dict(payload, repository=REPOSITORY)
+        headers = dict(headers or {}, **{"X-GitHub-Event": event})
+        return requests.post(self.url, data=json.dumps(payload), headers=headers)
+
+    def read_workflow(self):
+        """A workflow of a command that only reads, with no way to reach the api"""
+        self.provider.calls = []
+        workflow = Workflow(WebhookStateProvider(self.provider, self.state), Conventions, False)
+        workflow.prefetch()
+        return workflow
+
+    def test_reads_make_no_api_calls(self):
+        workflow = self.read_workflow()
+        self.assertEqual(workflow.get_queue(), ["release-1.3.0"])
+        self.assertEqual(workflow.get_pull_request_count("release-1.3.0"), 1)
+        self.assertEqual(str(workflow.get_latest_version()), "1.2.0")
+        self.assertEqual(self.provider.calls, [])
+
+    def test_new_branch_enters_the_queue(self):
+        self.post("create", {"ref": "hotfix-1.2.1", "ref_type": "branch"})
+        self.post("push", {"ref": "refs/heads/hotfix-1.2.1", "after": "abc", "created": True})
+        workflow = self.read_workflow()
+        self.assertEqual(workflow.get_queue(), ["hotfix-1.2.1", "release-1.3.0"])
+        self.assertEqual(workflow.get_branch_sha("hotfix-1.2.1"), "abc")
+        self.assertEqual(self.provider.calls, [])
+
+    def test_branch_created_before_its_push_is_completed_from_the_provider(self):
+        self.post("create", {"ref": "hotfix-1.2.1", "ref_type": "branch"})
+        self.assertEqual(self.provider.calls, ["get_ref"])
+        self.assertEqual(self.read_workflow().get_branch_sha("hotfix-1.2.1"), "sha-hotfix-1.2.1")
+
+    def test_deleted_branch_leaves_the_queue(self):
+        self.post("delete", {"ref": "release-1.3.0", "ref_type": "branch"})
+        self.assertEqual(self.read_workflow().get_queue(), [])
+
+    def test_published_release_is_the_latest(self):
+        self.post("release", {"action": "published",
+                              "release": {"tag_name": "v1.3.0", "draft": False, "prerelease": False}})
+        self.post("release", {"action": "published",
+                              "release": {"tag_name": "v1.4.0-rc1", "draft": False, "prerelease": True}})
+        self.assertEqual(str(self.read_workflow().get_latest_version()), "1.3.0")
+
+    def test_pull_requests_are_counted_once(self):
+        opened = {"action": "opened",
+                  "pull_request": {"number": 3, "state": "open", "base": {"ref": "release-1.3.0"}}}
+        self.post("pull_request", opened)
+        self.post("pull_request", opened)
+        self.assertEqual(self.read_workflow().get_pull_request_count("release-1.3.0"), 2)
+        self.post("pull_request", {"action": "closed",
+                                   "pull_request": {"number": 1, "state": "closed",
+                                                    "base": {"ref": "release-1.3.0"}}})
+        self.assertEqual(self.read_workflow().get_pull_request_count("release-1.3.0"), 1)
+
+    def test_unsigned_deliveries_are_rejected_with_a_secret(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.start_server("secret")
+        payload = {"ref": "hotfix-1.2.1", "ref_type": "branch"}
+        self.assertEqual(self.post("create", payload).status_code, 401)
+        body = json.dumps(dict(payload, repository=REPOSITORY))
+        signature = "sha256=" + hmac.new("secret", body, hashlib.sha256).hexdigest()
+        response = requests.post(self.url, data=body,
+                                 headers={"X-GitHub-Event": "create", "X-Hub-Signature-256": signature})
+        self.assertEqual(response.status_code, 204)
+
+    def test_without_the_model_the_provider_is_read(self):
+        self.state.remove()
+        self.read_workflow().get_queue()
+        self.assertIn("get_branches", self.provider.calls)
+
+    def test_model_of_a_server_that_is_gone_is_not_used(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        with open(self.state.path) as f:
+            model = json.load(f)
+        model["pid"] = process.pid
+        with open(self.state.path, "w") as f:
+            json.dump(model, f)
+        self.read_workflow().get_queue()
+        self.assertIn("get_branches", self.provider.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
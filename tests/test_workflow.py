@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+# Unit tests
+
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+from fakes import FakeProvider, pull_request
+from release_tools.artifacts import ArtifactCache
+from release_tools.concurrency import Executor
+from release_tools.workflow import Workflow, Conventions, Version, VersionIndex
+
+
+class WritableProvider(FakeProvider):
+    """Counts the writes too. Archives have a README with the commit they're of"""
+    def create_branch_from_master(self, new_branch):
+        self.calls.append("create_branch_from_master")
+        self.branch_names.append(new_branch)
+
+    def merge(self, base, head, commit_message):
+        self.calls.append("merge")
+
+    def download_archive(self, branch, save_to_path):
+        self.calls.append("download_archive")
+        os.makedirs(os.path.join(save_to_path, "owner-repo-" + branch))
+        with open(os.path.join(save_to_path, "owner-repo-" + branch, "README.md"), "w") as f:
+            f.write(branch)
+
+
+class TestWorkflow(unittest.TestCase):
+    def setUp(self):
+        self.provider = WritableProvider(["master", "develop", "hotfix-1.2.1", "release-1.3.0"],
+                                         pull_requests=[pull_request(1, "release-1.3.0")])
+        self.workflow = Workflow(self.provider, Conventions, False)
+
+    def test_queue_has_hotfix_before_release(self):
+        self.assertEqual(self.workflow.get_queue(), ["hotfix-1.2.1", "release-1.3.0"])
+
+    def test_each_resource_is_fetched_once_per_command(self):
+        self.workflow.get_branch_names()
+        queue = self.workflow.get_queue()
+        self.workflow.get_latest_version()
+        self.workflow.get_candidate_version()
+        self.workflow.get_hotfix_version()
+        for branch in queue:
+            self.workflow.get_pull_request_count(branch)
+        self.workflow.has_pull_requests(queue[0])
+        self.assertEqual(sorted(self.provider.calls),
+                         ["get_branches", "get_latest_version_tag_name",
+                          "get_pull_requests", "get_pull_requests"])
+
+    def test_writes_invalidate_the_snapshot(self):
+        self.workflow.get_queue()
+        self.provider.branch_names.remove("release-1.3.0")
+        self.workflow.create_release_candidate()
+        self.assertIn("release-1.3.0", self.workflow.get_branch_names())
+        self.assertEqual(self.provider.calls.count("get_branches"), 2)
+
+
+class TestVersionIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = VersionIndex(["master", "develop", "release-notes", "hotfix-docs",
+                                   "release-1.10.0", "release-1.3.0", "release-2.0.0", "release-1.2.0",
+                                   "hotfix-1.2.3", "hotfix-1.2.1", "hotfix-1.2.0", "hotfix-1.1.5"],
+                                  Conventions)
+
+    def test_pending_hotfixes_have_the_same_minor_version(self):
+        self.assertEqual(self.index.pending_hotfixes(Version([1, 2, 1])), ["hotfix-1.2.3"])
+
+    def test_pending_releases_are_sorted_by_version(self):
+        self.assertEqual(self.index.pending_releases(Version([1, 2, 1])),
+                         ["release-1.3.0", "release-1.10.0", "release-2.0.0"])
+
+    def test_branches_not_named_after_a_version_are_ignored(self):
+        workflow = Workflow(FakeProvider(["develop", "release-notes", "release-1.3.0"]),
+                            Conventions, False)
+        self.assertEqual(workflow.get_queue(), ["release-1.3.0"])
+
+
+class BarrierProvider(FakeProvider):
+    """Can only return the branches if the latest release is requested at the same time"""
+    def __init__(self, *args, **kwargs):
+        FakeProvider.__init__(self, *args, **kwargs)
+        self.tag_requested = threading.Event()
+
+    def get_latest_version_tag_name(self):
+        self.tag_requested.set()
+        return FakeProvider.get_latest_version_tag_name(self)
+
+    def get_branches(self):
+        if not self.tag_requested.wait(5):
+            raise AssertionError("The reads were not run concurrently")
+        return FakeProvider.get_branches(self)
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.executor = Executor(4)
+        self.provider = BarrierProvider(["master", "develop", "hotfix-1.2.1", "release-1.3.0"],
+                                        pull_requests=[pull_request(1, "release-1.3.0")])
+        self.workflow = Workflow(self.provider, Conventions, False, executor=self.executor)
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_independent_reads_run_concurrently(self):
+        self.workflow.prefetch()
+        calls = list(self.provider.calls)
+        self.assertEqual(self.workflow.get_queue(), ["hotfix-1.2.1", "release-1.3.0"])
+        self.assertEqual(self.workflow.get_pull_request_count("release-1.3.0"), 1)
+        self.assertEqual(self.provider.calls, calls)
+        self.assertEqual(calls.count("get_pull_requests"), 2)
+
+
+class MovingProvider(WritableProvider):
+    """A release branch that moves on by a commit adding one file"""
+    def __init__(self):
+        WritableProvider.__init__(self)
+        self.move("release-1.3.0", "a" * 40)
+
+    def compare(self, base, head):
+        return {"merge_base_commit": {"sha": base}, "files": [{"filename": "CHANGES.md", "status": "added"}]}
+
+    def get_tree(self, ref):
+        return {"tree": [{"path": "CHANGES.md", "type": "blob", "mode": "100644"}]}
+
+    def download_file(self, path, ref, save_to_path):
+        self.calls.append("download_file")
+        with open(save_to_path, "w") as f:
+            f.write(ref)
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ArtifactCache(os.path.join(self.directory, "cache"))
+        self.provider = WritableProvider()
+        self.workflow = Workflow(self.provider, Conventions, False, self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unchanged_candidate_is_not_downloaded_again(self):
+        builds = os.path.join(self.directory, "builds")
+        self.workflow.download_next_in_queue(builds, False)
+        self.workflow.download_next_in_queue(os.path.join(self.directory, "other"), False)
+        self.assertEqual(self.provider.calls.count("download_archive"), 1)
+        readme = os.path.join(self.directory, "other", "release-1.3.0",
+                              "owner-repo-sha-release-1.3.0", "README.md")
+        with open(readme) as f:
+            self.assertEqual(f.read(), "sha-release-1.3.0")
+
+    def test_cached_files_are_read_only(self):
+        builds = os.path.join(self.directory, "builds")
+        self.workflow.download_next_in_queue(builds, False)
+        readme = os.path.join(builds, "release-1.3.0", "owner-repo-sha-release-1.3.0", "README.md")
+        self.assertFalse(os.stat(readme).st_mode & stat.S_IWUSR)
+        self.workflow.download_next_in_queue(builds, True)
+        self.cache.gc(max_bytes=0)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_gc_evicts_least_recently_used(self):
+        self.workflow.download_next_in_queue(os.path.join(self.directory, "builds"), False)
+        self.cache.gc(max_bytes=0)
+        self.assertIsNone(self.cache.lookup("sha-release-1.3.0"))
+
+    def test_tree_larger_than_the_cache_is_kept_until_materialised(self):
+        self.cache.max_bytes = 1
+        builds = os.path.join(self.directory, "builds")
+        self.workflow.download_next_in_queue(builds, False)
+        self.assertTrue(os.path.exists(os.path.join(builds, "release-1.3.0")))
+
+
+class TestDeltaDownload(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ArtifactCache(os.path.join(self.directory, "cache"))
+        self.provider = MovingProvider()
+        self.workflow = Workflow(self.provider, Conventions, False, self.cache)
+        self.workflow.download_next_in_queue(os.path.join(self.directory, "builds"), False)
+        self.provider.move("release-1.3.0", "b" * 40)
+        self.workflow.invalidate()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, "next", "release-1.3.0", "owner-repo-bbbbbbb", name)) as f:
+            return f.read()
+
+    def test_changes_since_the_base_are_downloaded(self):
+        self.workflow.download_next_in_queue(os.path.join(self.directory, "next"), False, delta_base="a" * 40)
+        self.assertEqual(self.provider.calls.count("download_archive"), 1)
+        self.assertEqual(self.read("README.md"), "a" * 40)
+        self.assertEqual(self.read("CHANGES.md"), "b" * 40)
+
+    def test_base_defaults_to_the_newest_tree_of_the_branch(self):
+        self.workflow.download_next_in_queue(os.path.join(self.directory, "next"), False, delta=True)
+        self.assertEqual(self.provider.calls.count("download_archive"), 1)
+        self.assertEqual(self.provider.calls.count("download_file"), 1)
+        self.assertEqual(self.cache.newest("release-1.3.0")["sha"], "b" * 40)
+
+
+if __name__ == "__main__":
+    unittest.main()